@@ -0,0 +1,53 @@
+#!/usr/bin/python
+import argparse
+import importlib
+import sys
+
+# Maps each sub-command to the module implementing it. Modules are only
+# imported once their command is selected, so startup stays cheap.
+COMMANDS = {
+    'ogs': ('ogs_collection_to_sgf', 'Download OGS puzzles as SGF files.'),
+    'tsumego-hero': ('tsumego_hero_collection_to_sgf', 'Download Tsumego Hero collections as SGF files.'),
+    'crawl': ('crawl_queue', 'Crawl collections with several workers sharing a work queue.'),
+    'convert': ('convert_tsumego_hero_sgf_to_ogs_format', 'Convert Tsumego Hero SGFs to OGS format.'),
+    'index': ('sgf_index', 'Build a metadata index of SGF problems for deck selection and ordering.'),
+    'anki': ('sgf_to_anki', 'Convert a directory of SGF files to an Anki import file.'),
+    'validate': ('validate_sgf', 'Replay SGF problems and report illegal or suspicious moves.'),
+}
+
+
+def load_command(name):
+    """
+    Imports the module implementing the given sub-command and returns it.
+    Works both as part of the `src` package and when run as a script.
+    """
+    module_name = COMMANDS[name][0]
+    if __package__:
+        return importlib.import_module(f'.{module_name}', __package__)
+    return importlib.import_module(module_name)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(
+        description='Download Go problems and turn them into Anki decks.'
+    )
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text, add_help=False)
+
+    # Only the command name is parsed here; everything after it is handed to
+    # the command's own argument parser.
+    args, rest = parser.parse_known_args(argv[:1])
+    rest += argv[1:]
+
+    module = load_command(args.command)
+    sys.argv = [f'{parser.prog} {args.command}'] + rest
+    module.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,12 @@ class SGFNode:
         self.parent = parent
 
     def add_property(self, key, value):
-        self.properties[key] = value
+        # A property repeated within a node (e.g. TR[aa]TR[bb]) is merged
+        # into one list of values rather than overwritten.
+        if key in self.properties:
+            self.properties[key] = self.properties[key] + value
+        else:
+            self.properties[key] = value
 
     def __repr__(self):
         return f"Node({self.properties.keys()})"
@@ -79,6 +84,141 @@ def parse_sgf_to_tree(content):
             
     return root
 
+SGF_TREE_DELIMITERS = re.compile(r'[()\[\]\\]')
+
+def iter_sgf_game_tree_spans(file, chunk_size=65536):
+    """
+    Reads an SGF collection from a file object in chunks and yields
+    (offset, text) for each top-level game tree "(...)" as soon as it is
+    complete, where offset is the position of its "(" in the stream. Only
+    the game tree being read is held in memory.
+    """
+    parts = []
+    depth = 0
+    in_value = False
+    escaped = False
+    chunk_offset = 0
+    tree_offset = 0
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        start = 0 if depth else None
+        # Index of the character escaped by a backslash, if it is a delimiter
+        skip = 0 if escaped else -1
+        escaped = False
+        for match in SGF_TREE_DELIMITERS.finditer(chunk):
+            i = match.start()
+            if i == skip:
+                continue
+            char = match.group()
+            if in_value:
+                if char == '\\':
+                    skip = i + 1
+                    escaped = skip == len(chunk)
+                elif char == ']':
+                    in_value = False
+            elif char == '[':
+                in_value = depth > 0
+            elif char == '(':
+                if depth == 0:
+                    start = i
+                    tree_offset = chunk_offset + i
+                depth += 1
+            elif char == ')' and depth:
+                depth -= 1
+                if depth == 0:
+                    parts.append(chunk[start:i + 1])
+                    yield tree_offset, ''.join(parts)
+                    parts = []
+                    start = None
+        if depth:
+            parts.append(chunk[start:])
+        chunk_offset += len(chunk)
+    if parts:
+        # Unterminated game tree, let the parser make the best of it
+        yield tree_offset, ''.join(parts)
+
+def iter_sgf_game_tree_texts(file, chunk_size=65536):
+    """
+    Yields the text of each top-level game tree in an SGF file object.
+    """
+    for _, text in iter_sgf_game_tree_spans(file, chunk_size):
+        yield text
+
+def iter_sgf_games(file, chunk_size=65536, decode=None):
+    """
+    Yields (game, offset, text, root) for each top-level game tree in an SGF
+    file object that holds a game, numbering games from 1. Empty trees like
+    "()" are skipped, so every caller numbers the games of a file the same
+    way. `decode`, if given, converts the raw text before it is parsed.
+    """
+    game = 0
+    for offset, text in iter_sgf_game_tree_spans(file, chunk_size):
+        roots = parse_sgf_to_tree(decode(text) if decode else text).children
+        if roots:
+            game += 1
+            yield game, offset, text, roots[0]
+
+def iter_sgf_game_trees(file, chunk_size=65536):
+    """
+    Yields the root node of each top-level game tree in an SGF file object,
+    parsing one game tree at a time.
+    """
+    for text in iter_sgf_game_tree_texts(file, chunk_size):
+        yield from parse_sgf_to_tree(text).children
+
+def board_size(root):
+    """
+    Returns (width, height) from the SZ property, e.g. SZ[19] or SZ[19:13].
+    """
+    if 'SZ' not in root.properties:
+        return 19, 19
+    size = root.properties['SZ'][0]
+    if ':' in size:
+        width, height = size.split(':')
+        return int(width), int(height)
+    return int(size), int(size)
+
+def parse_point(value, width, height):
+    """
+    Returns (row, col) for an SGF point like 'cd', or None for a pass.
+    Raises ValueError for points that are malformed or off the board.
+    """
+    if value == '' or (value == 'tt' and width <= 19 and height <= 19):
+        return None
+    if len(value) != 2 or not value.isalpha():
+        raise ValueError(f"malformed point '{value}'")
+    col, row = ord(value[0].lower()) - ord('a'), ord(value[1].lower()) - ord('a')
+    if value[0].isupper():
+        col += 26
+    if value[1].isupper():
+        row += 26
+    if not (0 <= col < width and 0 <= row < height):
+        raise ValueError(f"point '{value}' is off the board")
+    return row, col
+
+def parse_point_list(values, width, height):
+    """
+    Yields (row, col) for every point of a setup property, expanding
+    compressed rectangles like 'aa:cc'. Raises ValueError for rectangles
+    whose corners are passes.
+    """
+    for value in values:
+        if ':' in value:
+            first, last = value.split(':', 1)
+            corners = parse_point(first, width, height), parse_point(last, width, height)
+            if None in corners:
+                raise ValueError(f"rectangle '{value}' has a pass as a corner")
+            (row1, col1), (row2, col2) = corners
+            for row in range(min(row1, row2), max(row1, row2) + 1):
+                for col in range(min(col1, col2), max(col1, col2) + 1):
+                    yield row, col
+        else:
+            point = parse_point(value, width, height)
+            if point is not None:
+                yield point
+
 def serialize_tree_to_sgf(node):
     # node is the dummy root initially
     # but for recursive calls it's a normal node
@@ -161,28 +301,26 @@ def main():
     
     processed_count = 0
     for file_path in files_to_process:
+        tmp_path = file_path + ".tmp"
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            root = parse_sgf_to_tree(content)
-            
-            # The root is a dummy, process its children (the actual game roots)
-            for child in root.children:
-                process_node(child)
-            
-            new_content = serialize_tree_to_sgf(root)
+            # Game trees are converted one at a time into a temporary file, so
+            # large collection files never have to fit in memory.
+            with open(file_path, 'r', encoding='utf-8') as f, open(tmp_path, 'w', encoding='utf-8') as out:
+                for game in iter_sgf_game_trees(f):
+                    process_node(game)
+                    out.write(serialize_tree_to_sgf(game))
             
             if args.backup:
                 shutil.copy2(file_path, file_path + ".bak")
 
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
+            os.replace(tmp_path, file_path)
                 
             print(f"Processed: {file_path}")
             processed_count += 1
             
         except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             print(f"Error processing {file_path}: {e}")
 
     print(f"\nTotal files processed: {processed_count}")
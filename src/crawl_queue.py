@@ -0,0 +1,381 @@
+#!/usr/bin/python
+import argparse
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+try:
+    from . import ogs_collection_to_sgf as ogs
+    from . import tsumego_hero_collection_to_sgf as tsumego_hero
+except ImportError:
+    # Run as a script from the src directory
+    import ogs_collection_to_sgf as ogs
+    import tsumego_hero_collection_to_sgf as tsumego_hero
+
+QUEUE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    id integer primary key, kind text not null, url text not null unique,
+    site text not null, output_dir text not null,
+    state text not null default 'pending', attempts integer not null default 0,
+    not_before real not null default 0, lease_owner text, lease_expires real,
+    last_error text
+);
+CREATE INDEX IF NOT EXISTS ix_items_state ON items (state, not_before);
+CREATE TABLE IF NOT EXISTS sites (
+    site text primary key, interval real not null, next_request real not null default 0
+);
+'''
+
+# Minimum seconds between two requests to a site, shared by all workers.
+# These match the delays used by the single-process download scripts.
+DEFAULT_INTERVALS = {'tsumego.com': 1.0, 'online-go.com': 5.0}
+DEFAULT_INTERVAL = 1.0
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30.0
+# How long an idle worker waits before looking for work again
+POLL_SECONDS = 1.0
+
+QueueItem = namedtuple('QueueItem', ['id', 'kind', 'url', 'site', 'output_dir', 'attempts'])
+
+
+class WorkQueue:
+    """
+    A crawl work queue stored in a SQLite file shared by all workers. Every
+    state change runs in a BEGIN IMMEDIATE transaction, so SQLite's file lock
+    serializes claims and rate-limit bookings across processes.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.executescript(QUEUE_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def transaction(self):
+        return Transaction(self.conn)
+
+    def add_site(self, site, interval=None):
+        """
+        Registers a site in the shared rate budget. Without an interval, a
+        site that is already registered keeps its current interval.
+        """
+        with self.transaction():
+            if interval is None:
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO sites (site, interval) VALUES (?, ?)',
+                    (site, DEFAULT_INTERVALS.get(site, DEFAULT_INTERVAL))
+                )
+            else:
+                self.conn.execute(
+                    'INSERT INTO sites (site, interval) VALUES (?, ?) ON CONFLICT (site) DO UPDATE SET interval = excluded.interval',
+                    (site, interval)
+                )
+
+    def enqueue(self, kind, urls, output_dir):
+        """
+        Adds download items, skipping URLs that are already queued. Returns
+        the number of new items.
+        """
+        with self.transaction():
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO items (kind, url, site, output_dir) VALUES (?, ?, ?, ?)',
+                ((kind, url, urlparse(url).netloc, output_dir) for url in urls)
+            )
+            return self.conn.total_changes - before
+
+    def claim(self, worker_id, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """
+        Leases the next item that is due. Items whose lease has expired,
+        because their worker died or hung, are released first and count as
+        a failed attempt, so an item that keeps killing its worker ends up
+        failed. Returns None if nothing is due.
+        """
+        now = time.time()
+        with self.transaction():
+            self.conn.execute(
+                "UPDATE items SET state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END, "
+                "attempts = attempts + 1, last_error = 'lease expired', lease_owner = NULL, lease_expires = NULL "
+                "WHERE state = 'leased' AND lease_expires <= ?",
+                (max_attempts, now)
+            )
+            row = self.conn.execute(
+                "SELECT id, kind, url, site, output_dir, attempts FROM items "
+                "WHERE state = 'pending' AND not_before <= ? "
+                "ORDER BY not_before, id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE items SET state = 'leased', lease_owner = ?, lease_expires = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, row[0])
+            )
+        return QueueItem(*row)
+
+    def extend_lease(self, item, worker_id, expires):
+        """
+        Moves the end of a lease to `expires`. Returns False if the worker no
+        longer holds the lease.
+        """
+        with self.transaction():
+            return self.conn.execute(
+                "UPDATE items SET lease_expires = ? WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (expires, item.id, worker_id)
+            ).rowcount == 1
+
+    def complete(self, item, worker_id):
+        """
+        Marks a leased item done. Returns False if the worker no longer held
+        the lease, in which case the item is left to its new owner.
+        """
+        with self.transaction():
+            return self.conn.execute(
+                "UPDATE items SET state = 'done', lease_owner = NULL, lease_expires = NULL, last_error = NULL "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (item.id, worker_id)
+            ).rowcount == 1
+
+    def fail(self, item, worker_id, error, max_attempts=MAX_ATTEMPTS, backoff=BACKOFF_SECONDS):
+        """
+        Requeues a failed item with exponential backoff, or marks it failed
+        once it has been tried max_attempts times.
+        """
+        attempts = item.attempts + 1
+        with self.transaction():
+            if attempts >= max_attempts:
+                self.conn.execute(
+                    "UPDATE items SET state = 'failed', attempts = ?, last_error = ?, lease_owner = NULL, lease_expires = NULL "
+                    "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                    (attempts, error, item.id, worker_id)
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE items SET state = 'pending', attempts = ?, last_error = ?, not_before = ?, "
+                    "lease_owner = NULL, lease_expires = NULL WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                    (attempts, error, time.time() + backoff * 2 ** (attempts - 1), item.id, worker_id)
+                )
+
+    def reserve_request(self, site):
+        """
+        Books the next request slot for a site in the shared rate budget and
+        returns the time at which the request may be sent.
+        """
+        now = time.time()
+        with self.transaction():
+            row = self.conn.execute('SELECT interval, next_request FROM sites WHERE site = ?', (site,)).fetchone()
+            if row is None:
+                interval, next_request = DEFAULT_INTERVALS.get(site, DEFAULT_INTERVAL), 0
+                self.conn.execute('INSERT INTO sites (site, interval) VALUES (?, ?)', (site, interval))
+            else:
+                interval, next_request = row
+            slot = max(now, next_request)
+            self.conn.execute('UPDATE sites SET next_request = ? WHERE site = ?', (slot + interval, site))
+        return slot
+
+    def wait_for_request(self, site):
+        delay = self.reserve_request(site) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def counts(self):
+        return dict(self.conn.execute('SELECT state, COUNT(*) FROM items GROUP BY state'))
+
+    def is_finished(self):
+        counts = self.counts()
+        return not counts.get('pending') and not counts.get('leased')
+
+
+class Transaction:
+    """
+    Context manager running a block in a BEGIN IMMEDIATE transaction.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        return False
+
+
+def download_tsumego_hero_problem(session, url, output_dir):
+    title, sgf_content = tsumego_hero.get_problem_details(session, url)
+    if not (title and sgf_content):
+        raise RuntimeError(f"Could not download {url}")
+    tsumego_hero.save_problem(output_dir, title, sgf_content)
+
+
+def create_worker_session(kind):
+    """
+    Returns the session passed to the handler of an item kind. Sessions send
+    each request once: every attempt must be booked with wait_for_request,
+    and failed items are retried through WorkQueue.fail's backoff.
+    """
+    if kind == 'tsumego-hero':
+        return tsumego_hero.create_session(max_retries=0)
+    return None
+
+
+def download_ogs_puzzle(session, url, output_dir):
+    puzzle, _ = ogs.fetch_puzzle(url, [])
+    ogs.create_sgf_file(puzzle, output_dir)
+
+
+# Download function for each item kind, called as handler(session, url, output_dir)
+HANDLERS = {
+    'tsumego-hero': download_tsumego_hero_problem,
+    'ogs': download_ogs_puzzle,
+}
+
+
+def seed_tsumego_hero(queue, collection_url, output, interval=None):
+    """
+    Queues every problem of a Tsumego Hero collection. Returns the number of
+    newly queued problems, or None if the collection page can't be loaded.
+    The collection page request is booked in the site's rate budget.
+    """
+    site = urlparse(collection_url).netloc
+    queue.add_site(site, interval)
+    session = create_worker_session('tsumego-hero')
+    queue.wait_for_request(site)
+    collection_name, problem_urls = tsumego_hero.get_collection_details(session, collection_url)
+    if collection_name is None:
+        return None
+    folder_name = os.path.join(output, tsumego_hero.sanitize_filename(collection_name))
+    os.makedirs(folder_name, exist_ok=True)
+    return queue.enqueue('tsumego-hero', problem_urls, folder_name)
+
+
+def seed_ogs(queue, puzzle_id, output, interval=None):
+    """
+    Queues every puzzle in the OGS collection containing puzzle_id. Returns
+    the number of newly queued puzzles, or None if the puzzle is not part of
+    a collection. The puzzle and collection requests are booked in the
+    site's rate budget.
+    """
+    site = urlparse(ogs.OGS_API_URL).netloc
+    queue.add_site(site, interval)
+    queue.wait_for_request(site)
+    _, collection_name = ogs.download_puzzle(puzzle_id, [])
+    if collection_name is None:
+        print(f"Puzzle {puzzle_id} is not part of a collection.")
+        return None
+    folder_name = os.path.join(output, collection_name)
+    os.makedirs(folder_name, exist_ok=True)
+    queue.wait_for_request(site)
+    puzzle_ids = ogs.download_collection(puzzle_id, [])
+    if puzzle_id not in puzzle_ids:
+        puzzle_ids.insert(0, puzzle_id)
+    return queue.enqueue('ogs', [ogs.puzzle_url(i) for i in puzzle_ids], folder_name)
+
+
+def run_worker(queue_path, worker_id=None, max_attempts=MAX_ATTEMPTS, backoff=BACKOFF_SECONDS, poll=POLL_SECONDS,
+               lease_seconds=LEASE_SECONDS):
+    """
+    Claims and downloads items until the queue has no pending or leased
+    items left. Returns the number of items downloaded by this worker.
+    The lease of a claimed item is extended past its booked request slot,
+    so waiting for the site's rate budget never lets the lease expire.
+    """
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(queue_path)
+    sessions = {}
+    downloaded = 0
+    try:
+        while True:
+            item = queue.claim(worker_id, lease_seconds, max_attempts)
+            if item is None:
+                if queue.is_finished():
+                    return downloaded
+                time.sleep(poll)
+                continue
+            if item.kind not in sessions:
+                sessions[item.kind] = create_worker_session(item.kind)
+            slot = queue.reserve_request(item.site)
+            if not queue.extend_lease(item, worker_id, slot + lease_seconds):
+                print(f"[{worker_id}] Lost the lease on {item.url}")
+                continue
+            delay = slot - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                HANDLERS[item.kind](sessions[item.kind], item.url, item.output_dir)
+            except Exception as e:
+                print(f"[{worker_id}] Failed {item.url}: {e}")
+                queue.fail(item, worker_id, str(e), max_attempts, backoff)
+            else:
+                if queue.complete(item, worker_id):
+                    downloaded += 1
+                else:
+                    print(f"[{worker_id}] Lost the lease on {item.url} while downloading it")
+    finally:
+        queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Crawl Tsumego Hero or OGS collections with several workers sharing a SQLite work queue.'
+    )
+    parser.add_argument('queue', help='Path to the SQLite queue file. It is created if missing.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_th = subparsers.add_parser('seed-tsumego-hero', help='Queue all problems of a Tsumego Hero collection.')
+    seed_th.add_argument('url', help='The URL of the collection (e.g., https://tsumego.com/sets/view/50/1).')
+    seed_th.add_argument('--output', default='.', help='The parent output directory. A subdirectory named after the collection is created here.')
+    seed_th.add_argument('--interval', type=float, help='Seconds between requests to the site across all workers.')
+
+    seed_ogs_parser = subparsers.add_parser('seed-ogs', help='Queue all puzzles of the OGS collection containing a puzzle.')
+    seed_ogs_parser.add_argument('puzzle_id', type=int, help='The ID of a puzzle in the collection.')
+    seed_ogs_parser.add_argument('--output', default='.', help='The parent output directory. A subdirectory named after the collection is created here.')
+    seed_ogs_parser.add_argument('--interval', type=float, help='Seconds between requests to the site across all workers.')
+
+    work = subparsers.add_parser('work', help='Download queued items until the queue is empty.')
+    work.add_argument('--processes', type=int, default=1, help='Number of worker processes to run on this host.')
+    work.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help='Attempts before an item is marked failed.')
+    work.add_argument('--backoff', type=float, default=BACKOFF_SECONDS, help='Seconds before the first retry of a failed item, doubled on every further failure.')
+
+    subparsers.add_parser('status', help='Show the number of items in each state.')
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue)
+    try:
+        if args.command == 'seed-tsumego-hero':
+            added = seed_tsumego_hero(queue, args.url, args.output, args.interval)
+            if added is None:
+                return
+            print(f"Queued {added} new problems.")
+        elif args.command == 'seed-ogs':
+            added = seed_ogs(queue, args.puzzle_id, args.output, args.interval)
+            if added is None:
+                return
+            print(f"Queued {added} new puzzles.")
+        elif args.command == 'status':
+            for state, count in sorted(queue.counts().items()):
+                print(f"{state}: {count}")
+    finally:
+        queue.close()
+
+    if args.command == 'work':
+        worker_args = (args.queue, None, args.max_attempts, args.backoff)
+        if args.processes == 1:
+            downloaded = run_worker(*worker_args)
+        else:
+            with multiprocessing.Pool(args.processes) as pool:
+                downloaded = sum(pool.starmap(run_worker, [worker_args] * args.processes))
+        print(f"Downloaded {downloaded} items.")
+
+
+if __name__ == '__main__':
+    main()
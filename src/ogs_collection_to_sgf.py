@@ -1,9 +1,148 @@
-import requests
 import os
+import string
 import time
 import argparse
-from tqdm import tqdm
 
+# requests and tqdm are imported inside the functions that use them so that
+# `--help` and offline callers don't pay for loading them.
+
+
+OGS_API_URL = 'https://online-go.com/api'
+
+# SGF property written for each OGS mark type, in order of precedence
+# SGF point letters: a-z for 0-25, then A-Z for 26-51 on boards up to 52x52
+SGF_COORDINATES = string.ascii_lowercase + string.ascii_uppercase
+MARK_PROPERTIES = [('letter', 'LB'), ('triangle', 'TR'), ('square', 'SQ'), ('cross', 'MA'), ('circle', 'CR')]
+
+
+class Mark:
+    __slots__ = ('x', 'y', 'kind', 'letter')
+
+    def __init__(self, x, y, kind, letter=None):
+        self.x = x
+        self.y = y
+        self.kind = kind
+        self.letter = letter
+
+
+class MoveNode:
+    __slots__ = ('x', 'y', 'text', 'correct', 'wrong', 'marks', 'branches')
+
+    def __init__(self, x, y, text=None, correct=False, wrong=False, marks=(), branches=()):
+        self.x = x
+        self.y = y
+        self.text = text
+        self.correct = correct
+        self.wrong = wrong
+        self.marks = marks
+        self.branches = branches
+
+
+class Puzzle:
+    __slots__ = ('name', 'width', 'height', 'initial_black', 'initial_white', 'initial_player', 'description', 'move_tree')
+
+    def __init__(self, name, width, height, initial_black, initial_white, initial_player, description, move_tree):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.initial_black = initial_black
+        self.initial_white = initial_white
+        self.initial_player = initial_player
+        self.description = description
+        self.move_tree = move_tree
+
+
+def expect(value, types, path):
+    if not isinstance(value, types) or isinstance(value, bool) and bool not in types:
+        raise ValueError(f"Invalid puzzle JSON at {path}: unexpected {type(value).__name__} {value!r}")
+    return value
+
+def decode_marks(marks, width, height, path):
+    decoded = []
+    for i, mark in enumerate(expect(marks, (list,), path)):
+        mark_path = f'{path}[{i}]'
+        expect(mark, (dict,), mark_path)
+        kinds = expect(mark.get('marks'), (dict,), f'{mark_path}.marks')
+        for key, kind in MARK_PROPERTIES:
+            if key in kinds:
+                x = expect(mark.get('x'), (int,), f'{mark_path}.x')
+                y = expect(mark.get('y'), (int,), f'{mark_path}.y')
+                if not (0 <= x < width and 0 <= y < height):
+                    raise ValueError(f"Invalid puzzle JSON at {mark_path}: mark ({x}, {y}) is off the board")
+                letter = expect(kinds[key], (str,), f'{mark_path}.marks.letter') if key == 'letter' else None
+                decoded.append(Mark(x, y, kind, letter))
+                break
+    return tuple(decoded)
+
+def decode_move_tree(move_tree, width, height):
+    """
+    Converts an OGS move tree into MoveNode records in one iterative pass,
+    validating coordinates and types on the way.
+    """
+    root = None
+    # Each entry: (JSON node, decoded parent, index among the parent's branches, path)
+    stack = [(move_tree, None, 0, 'move_tree')]
+    while stack:
+        node, parent, index, path = stack.pop()
+        expect(node, (dict,), path)
+        x = expect(node.get('x', -1), (int,), f'{path}.x')
+        y = expect(node.get('y', -1), (int,), f'{path}.y')
+        if parent is not None and not (0 <= x < width and 0 <= y < height):
+            raise ValueError(f"Invalid puzzle JSON at {path}: move ({x}, {y}) is off the board")
+        text = expect(node['text'], (str,), f'{path}.text') if 'text' in node else None
+        marks = decode_marks(node['marks'], width, height, f'{path}.marks') if 'marks' in node else ()
+        decoded = MoveNode(x, y, text, 'correct_answer' in node, 'wrong_answer' in node, marks)
+        if parent is None:
+            root = decoded
+        else:
+            parent.branches[index] = decoded
+        if 'branches' in node:
+            branches = expect(node['branches'], (list,), f'{path}.branches')
+            decoded.branches = [None] * len(branches)
+            stack.extend((branch, decoded, i, f'{path}.branches[{i}]') for i, branch in enumerate(branches))
+    return root
+
+def decode_collection_summary(collection):
+    """
+    Returns the puzzle ids listed by the OGS collection_summary API.
+    """
+    expect(collection, (list,), 'collection')
+    return [expect(expect(puzzle, (dict,), f'collection[{i}]').get('id'), (int,), f'collection[{i}].id')
+            for i, puzzle in enumerate(collection)]
+
+def decode_collection_name(collection):
+    """
+    Returns the name from the `collection` object of the OGS puzzle API, or
+    None for a puzzle that is not part of a collection.
+    """
+    if collection is None:
+        return None
+    expect(collection, (dict,), 'collection')
+    return expect(collection.get('name'), (str,), 'collection.name')
+
+def decode_puzzle(puzzle):
+    """
+    Converts the `puzzle` object of the OGS puzzle API into a Puzzle record,
+    raising ValueError if it doesn't match the expected schema.
+    """
+    expect(puzzle, (dict,), 'puzzle')
+    name = expect(puzzle.get('name'), (str,), 'name')
+    width = expect(puzzle.get('width'), (int,), 'width')
+    height = expect(puzzle.get('height'), (int,), 'height')
+    if not (0 < width <= 52 and 0 < height <= 52):
+        raise ValueError(f"Invalid puzzle JSON at width/height: unsupported board size {width}x{height}")
+    initial_state = expect(puzzle.get('initial_state'), (dict,), 'initial_state')
+    initial_black = expect(initial_state.get('black', ''), (str,), 'initial_state.black')
+    initial_white = expect(initial_state.get('white', ''), (str,), 'initial_state.white')
+    for color, stones in (('black', initial_black), ('white', initial_white)):
+        if len(stones) % 2:
+            raise ValueError(f"Invalid puzzle JSON at initial_state.{color}: odd number of coordinates")
+    initial_player = expect(puzzle.get('initial_player'), (str,), 'initial_player')
+    if initial_player[:1].lower() not in ('b', 'w'):
+        raise ValueError(f"Invalid puzzle JSON at initial_player: {initial_player!r}")
+    description = expect(puzzle['puzzle_description'], (str,), 'puzzle_description') if 'puzzle_description' in puzzle else None
+    move_tree = decode_move_tree(puzzle.get('move_tree'), width, height)
+    return Puzzle(name, width, height, initial_black, initial_white, initial_player[0].upper(), description, move_tree)
 
 def escape(text):
     return text.replace('\\', '\\\\').replace(']', '\\]')
@@ -18,8 +157,8 @@ def otherPlayer(player):
     return 'B' if player == 'W' else 'W'
         
 def writeCoordinates(file, node):
-    file.write(chr(97 + node['x']))
-    file.write(chr(97 + node['y']))
+    file.write(SGF_COORDINATES[node.x])
+    file.write(SGF_COORDINATES[node.y])
     
 def writeCoordinatesInBrackets(file, node):
     file.write('[')
@@ -28,50 +167,39 @@ def writeCoordinatesInBrackets(file, node):
             
 def writeMarks(file, marks):
     for mark in marks:
-        if 'letter' in mark['marks']:
-            file.write('LB[')
+        file.write(mark.kind)
+        if mark.letter is not None:
+            file.write('[')
             writeCoordinates(file, mark)
             file.write(':')
-            file.write(escape(mark['marks']['letter']))
+            file.write(escape(mark.letter))
             file.write(']')
-        elif 'triangle' in mark['marks']:
-            file.write('TR')
-            writeCoordinatesInBrackets(file, mark)
-        elif 'square' in mark['marks']:
-            file.write('SQ')
-            writeCoordinatesInBrackets(file, mark)
-        elif 'cross' in mark['marks']:
-            file.write('MA')
-            writeCoordinatesInBrackets(file, mark)
-        elif 'circle' in mark['marks']:
-            file.write('CR')
+        else:
             writeCoordinatesInBrackets(file, mark)
 
 def prependText(node, text): 
-    if 'text' in node:
-        node['text'] = text + '\n\n' + node['text']
+    if node.text is not None:
+        node.text = text + '\n\n' + node.text
     else:
-        node['text'] = text
+        node.text = text
             
 def writeNode(file, node, player):
-    if 'marks' in node:
-        writeMarks(file, node['marks'])
-    if 'correct_answer' in node:
+    writeMarks(file, node.marks)
+    if node.correct:
         prependText(node, "CORRECT")
-    elif 'wrong_answer' in node:
+    elif node.wrong:
         prependText(node, "WRONG")
-    if 'text' in node:
+    if node.text is not None:
         file.write('C[')
-        file.write(escape(node['text']))
+        file.write(escape(node.text))
         file.write(']')
-    if 'branches' in node:
-        branches = node['branches']
-        for branch in branches:
-            if len(branches) > 1:
-                file.write('(')
-            writeBranch(file, branch, player)
-            if len(branches) > 1:
-                file.write(')')
+    branches = node.branches
+    for branch in branches:
+        if len(branches) > 1:
+            file.write('(')
+        writeBranch(file, branch, player)
+        if len(branches) > 1:
+            file.write(')')
         
 def writeBranch(file, branch, player):
     file.write(';')
@@ -81,31 +209,30 @@ def writeBranch(file, branch, player):
         
 def writePuzzle(file, puzzle):
     file.write('(;FF[4]CA[UTF-8]AP[puzzle2sgf:0.1]GM[1]GN[')
-    file.write(escape(puzzle['name']))
+    file.write(escape(puzzle.name))
     file.write(']SZ[')
-    file.write(str(puzzle['width']))
-    if puzzle['width'] != puzzle['height']:
+    file.write(str(puzzle.width))
+    if puzzle.width != puzzle.height:
         file.write(':')
-        file.write(str(puzzle['height']))
+        file.write(str(puzzle.height))
     file.write(']')
-    initial_black = puzzle['initial_state']['black']
-    if initial_black:
+    if puzzle.initial_black:
         file.write('AB')
-        writeInitialStones(file, initial_black)
-    initial_white = puzzle['initial_state']['white']
-    if initial_white:
+        writeInitialStones(file, puzzle.initial_black)
+    if puzzle.initial_white:
         file.write('AW')
-        writeInitialStones(file, initial_white)
-    if 'puzzle_description' in puzzle:
-        prependText(puzzle['move_tree'], puzzle['puzzle_description'])
-    player = puzzle['initial_player'][0].upper()
+        writeInitialStones(file, puzzle.initial_white)
+    if puzzle.description is not None:
+        prependText(puzzle.move_tree, puzzle.description)
     file.write('PL[')
-    file.write(player)
+    file.write(puzzle.initial_player)
     file.write(']')
-    writeNode(file, puzzle['move_tree'], player)
+    writeNode(file, puzzle.move_tree, puzzle.initial_player)
     file.write(')')
 
 def authenticate():
+    import requests
+
     url = 'https://online-go.com/api/v0/login'
     username =  input('Username: ')
     password =  input('Password: ')
@@ -116,22 +243,32 @@ def sanitize_filename(name):
     return name.replace('/', ' - ')
 
 def create_sgf_file(puzzle, output_dir):
-    filename = sanitize_filename(puzzle['name']) + '.sgf'
+    filename = sanitize_filename(puzzle.name) + '.sgf'
     filepath = os.path.join(output_dir, filename)
     with open(filepath, 'w', encoding="utf-8") as file:
         writePuzzle(file, puzzle)
 
-def download_puzzle(puzzle_id, cookies):
-    puzzleUrl = f'https://online-go.com/api/v1/puzzles/{puzzle_id}'
+def puzzle_url(puzzle_id):
+    return f'{OGS_API_URL}/v1/puzzles/{puzzle_id}'
+
+def fetch_puzzle(puzzleUrl, cookies):
+    import requests
+
     response = requests.get(puzzleUrl, cookies=cookies)
     response.raise_for_status()
-    return response.json()
+    responseJSON = expect(response.json(), (dict,), 'response')
+    return decode_puzzle(responseJSON.get('puzzle')), decode_collection_name(responseJSON.get('collection'))
+
+def download_puzzle(puzzle_id, cookies):
+    return fetch_puzzle(puzzle_url(puzzle_id), cookies)
 
 def download_collection(puzzle_id, cookies):
-    collectionUrl = f'https://online-go.com/api/v1/puzzles/{puzzle_id}/collection_summary'
+    import requests
+
+    collectionUrl = f'{puzzle_url(puzzle_id)}/collection_summary'
     response = requests.get(collectionUrl, cookies=cookies)
     response.raise_for_status()
-    return response.json()
+    return decode_collection_summary(response.json())
 
 def main():
     parser = argparse.ArgumentParser(description='Download OGS puzzles and convert them to SGF files.')
@@ -146,21 +283,25 @@ def main():
     os.makedirs(args.output, exist_ok=True)
 
     if args.collection:
-        responseJSON = download_puzzle(args.puzzle_id, cookies)
-        collectionName = responseJSON['collection']['name']
+        from tqdm import tqdm
+
+        puzzle, collectionName = download_puzzle(args.puzzle_id, cookies)
+        if collectionName is None:
+            print(f"Puzzle {args.puzzle_id} is not part of a collection.")
+            return
         collectionFolder = os.path.join(args.output, collectionName)
         os.makedirs(collectionFolder, exist_ok=True)
-        create_sgf_file(responseJSON['puzzle'], collectionFolder)
+        create_sgf_file(puzzle, collectionFolder)
 
-        collection = download_collection(args.puzzle_id, cookies)
-        for puzzle in tqdm(collection, desc="Downloading puzzles"):
-            if puzzle['id'] != args.puzzle_id:
+        puzzleIds = download_collection(args.puzzle_id, cookies)
+        for puzzleId in tqdm(puzzleIds, desc="Downloading puzzles"):
+            if puzzleId != args.puzzle_id:
                 time.sleep(5.0)
-                puzzleJSON = download_puzzle(puzzle['id'], cookies)['puzzle']
-                create_sgf_file(puzzleJSON, collectionFolder)
+                puzzle, _ = download_puzzle(puzzleId, cookies)
+                create_sgf_file(puzzle, collectionFolder)
     else:
-        responseJSON = download_puzzle(args.puzzle_id, cookies)
-        create_sgf_file(responseJSON['puzzle'], args.output)
+        puzzle, _ = download_puzzle(args.puzzle_id, cookies)
+        create_sgf_file(puzzle, args.output)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,197 @@
+#!/usr/bin/python
+import argparse
+import os
+import sqlite3
+
+try:
+    from .convert_tsumego_hero_sgf_to_ogs_format import (iter_sgf_games, process_node, board_size,
+                                                         parse_point, parse_point_list)
+except ImportError:
+    # Run as a script from the src directory
+    from convert_tsumego_hero_sgf_to_ogs_format import (iter_sgf_games, process_node, board_size,
+                                                        parse_point, parse_point_list)
+
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path text primary key, mtime_ns integer not null, size integer not null
+);
+CREATE TABLE IF NOT EXISTS problems (
+    path text not null, game integer not null, collection text not null,
+    byte_offset integer not null, byte_length integer not null, name text,
+    width integer not null, height integer not null,
+    nodes integer not null, depth integer not null,
+    leaves integer not null, correct_leaves integer not null,
+    max_branching integer not null, avg_branching real not null,
+    stones integer not null,
+    min_x integer, min_y integer, max_x integer, max_y integer,
+    primary key (path, game)
+) WITHOUT ROWID;
+'''
+
+# Columns of the problems table describing a problem, in insert order
+STAT_COLUMNS = [
+    'name', 'width', 'height', 'nodes', 'depth', 'leaves', 'correct_leaves',
+    'max_branching', 'avg_branching', 'stones', 'min_x', 'min_y', 'max_x', 'max_y',
+]
+
+
+def problem_stats(root):
+    """
+    Returns a dict of STAT_COLUMNS for a game tree. Leaves are labelled with
+    process_node first, so correct_leaves counts the leaves marked CORRECT
+    exactly as the converted SGF would. The bounding box covers all setup
+    stones and moves in every variation, in 0-based board coordinates.
+    """
+    width, height = board_size(root)
+    process_node(root)
+
+    nodes = depth = leaves = correct_leaves = 0
+    internal_nodes = child_count = max_branching = 0
+    stones = 0
+    rows = []
+    cols = []
+    stack = [(root, 0)]
+    while stack:
+        node, node_depth = stack.pop()
+        nodes += 1
+        depth = max(depth, node_depth)
+        for key in ('AB', 'AW'):
+            for row, col in parse_point_list(node.properties.get(key, []), width, height):
+                rows.append(row)
+                cols.append(col)
+                if node is root:
+                    stones += 1
+        for key in ('B', 'W'):
+            if node.properties.get(key):
+                point = parse_point(node.properties[key][0], width, height)
+                if point is not None:
+                    rows.append(point[0])
+                    cols.append(point[1])
+        if node.children:
+            internal_nodes += 1
+            child_count += len(node.children)
+            max_branching = max(max_branching, len(node.children))
+        else:
+            leaves += 1
+            if node.properties.get('C', [''])[0].startswith('CORRECT'):
+                correct_leaves += 1
+        stack.extend((child, node_depth + 1) for child in node.children)
+
+    return {
+        'name': root.properties.get('GN', [None])[0],
+        'width': width,
+        'height': height,
+        'nodes': nodes,
+        'depth': depth,
+        'leaves': leaves,
+        'correct_leaves': correct_leaves,
+        'max_branching': max_branching,
+        'avg_branching': child_count / internal_nodes if internal_nodes else 0.0,
+        'stones': stones,
+        'min_x': min(cols) if cols else None,
+        'min_y': min(rows) if rows else None,
+        'max_x': max(cols) if cols else None,
+        'max_y': max(rows) if rows else None,
+    }
+
+
+def index_sgf_file(file_path):
+    """
+    Yields (game, byte_offset, byte_length, stats) for each game tree in an
+    SGF file. The file is scanned as latin-1 so that character offsets equal
+    byte offsets in the UTF-8 file; SGF delimiters are all ASCII, which never
+    occurs inside a multi-byte UTF-8 sequence. Games with invalid sizes or
+    points are reported and left out, keeping the numbering of the others.
+    """
+    with open(file_path, 'r', encoding='latin-1', newline='') as f:
+        games = iter_sgf_games(f, decode=lambda raw_text: raw_text.encode('latin-1').decode('utf-8'))
+        for game, byte_offset, raw_text, root in games:
+            try:
+                stats = problem_stats(root)
+            except ValueError as e:
+                print(f"Skipping game {game} of {file_path}: {e}")
+                continue
+            yield game, byte_offset, len(raw_text), stats
+
+
+def find_index_files(input_dir, recursive=True):
+    """
+    Yields (collection, relative_path, path) for the SGF files in input_dir.
+    collection and relative_path use '/' as separator, collection is '' for
+    files directly in input_dir.
+    """
+    for root, dirs, files in os.walk(input_dir):
+        if not recursive:
+            dirs[:] = []
+        collection = os.path.relpath(root, input_dir).replace(os.sep, '/')
+        if collection == '.':
+            collection = ''
+        for file in files:
+            if file.endswith('.sgf'):
+                relative_path = f'{collection}/{file}' if collection else file
+                yield collection, relative_path, os.path.join(root, file)
+
+
+def build_index(input_dir, index_file, recursive=True):
+    """
+    Creates or updates the index of the SGF files in input_dir. Files whose
+    modification time and size are unchanged since the last run are skipped,
+    and files that no longer exist are dropped. Returns (indexed, skipped).
+    """
+    conn = sqlite3.connect(index_file)
+    try:
+        conn.executescript(INDEX_SCHEMA)
+        known = {path: (mtime_ns, size) for path, mtime_ns, size in conn.execute('SELECT path, mtime_ns, size FROM files')}
+        seen = set()
+        indexed = skipped = 0
+        insert = f"INSERT INTO problems VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(STAT_COLUMNS))})"
+        with conn:
+            for collection, relative_path, path in find_index_files(input_dir, recursive):
+                seen.add(relative_path)
+                stat = os.stat(path)
+                if known.get(relative_path) == (stat.st_mtime_ns, stat.st_size):
+                    skipped += 1
+                    continue
+                try:
+                    rows = [
+                        (relative_path, game, collection, byte_offset, byte_length) + tuple(stats[c] for c in STAT_COLUMNS)
+                        for game, byte_offset, byte_length, stats in index_sgf_file(path)
+                    ]
+                except Exception as e:
+                    print(f"Error indexing {path}: {e}")
+                    rows = None
+                conn.execute('DELETE FROM problems WHERE path = ?', (relative_path,))
+                if rows is None:
+                    conn.execute('DELETE FROM files WHERE path = ?', (relative_path,))
+                    continue
+                conn.executemany(insert, rows)
+                conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?)', (relative_path, stat.st_mtime_ns, stat.st_size))
+                indexed += 1
+            for relative_path in set(known) - seen:
+                conn.execute('DELETE FROM problems WHERE path = ?', (relative_path,))
+                conn.execute('DELETE FROM files WHERE path = ?', (relative_path,))
+    finally:
+        conn.close()
+    return indexed, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build a metadata index of SGF problems (tree size, depth, branching, correct leaves, stones, '
+                    'bounding box) for selecting and ordering deck contents without re-reading the SGF files.'
+    )
+    parser.add_argument('input_dir', help='Directory containing the SGF files (searched recursively).')
+    parser.add_argument('index_file', help='Path to the SQLite index file. An existing index is updated.')
+    parser.add_argument('--no-recursive', action='store_true', help='Only index SGF files directly in input_dir.')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        print(f"Error: Input directory not found at '{args.input_dir}'")
+        return
+
+    indexed, skipped = build_index(args.input_dir, args.index_file, not args.no_recursive)
+    print(f"Indexed {indexed} files into '{args.index_file}' ({skipped} unchanged).")
+
+
+if __name__ == '__main__':
+    main()
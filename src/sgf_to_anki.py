@@ -1,8 +1,77 @@
 #!/usr/bin/python
 import argparse
-import glob
+import hashlib
+import itertools
+import json
 import os
 import re
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+try:
+    from .convert_tsumego_hero_sgf_to_ogs_format import iter_sgf_games, parse_sgf_to_tree
+except ImportError:
+    # Run as a script from the src directory
+    from convert_tsumego_hero_sgf_to_ogs_format import iter_sgf_games, parse_sgf_to_tree
+
+# Stable id of the placeholder anki-tsumego note type written into .apkg
+# files when no note type is taken from the user's collection, so that
+# repeated imports reuse the same note type instead of creating copies.
+ANKI_MODEL_ID = 1607392319
+ANKI_MODEL_NAME = 'anki-tsumego'
+ANKI_FIELDS = ['SGF']
+# Properties not used by the anki-tsumego template, dropped by minify_sgf.
+MINIFY_DROPPED_PROPERTIES = {
+    'AP', 'CA', 'FF', 'ST', 'RU', 'GM', 'KM', 'HA', 'PW', 'PB', 'WR', 'BR', 'WT', 'BT',
+    'DT', 'EV', 'RO', 'PC', 'SO', 'US', 'AN', 'CP', 'GC', 'ON', 'OT', 'TM', 'RE', 'MN',
+}
+# Setup properties whose points are deduplicated and sorted by minify_sgf.
+MINIFY_POINT_LIST_PROPERTIES = {'AB', 'AW', 'AE'}
+# Number of notes inserted per executemany() call when writing a package.
+APKG_BATCH_SIZE = 1000
+GUID_CHARS = ('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+              '!#$%&()*+,-./:;<=>?@[]^_`{|}~')
+
+APKG_SCHEMA = '''
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null,
+    usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null,
+    tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null,
+    flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null,
+    type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null,
+    factor integer not null, time integer not null, type integer not null
+);
+CREATE TABLE graves (
+    usn integer not null, oid integer not null, type integer not null
+);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+'''
 
 
 def clean_sgf_comment(comment_text):
@@ -50,6 +119,42 @@ def process_sgf_content(sgf_content):
     return processed_sgf
 
 
+def write_minified_tree(node, parts):
+    parts.append('(')
+    while True:
+        parts.append(';')
+        for key, values in node.properties.items():
+            if key in MINIFY_DROPPED_PROPERTIES:
+                continue
+            if key in MINIFY_POINT_LIST_PROPERTIES:
+                values = sorted(set(values))
+            elif key == 'C':
+                values = [value for value in values if value.strip()]
+            if values:
+                parts.append(key)
+                parts.extend(f'[{value}]' for value in values)
+        if len(node.children) != 1:
+            break
+        node = node.children[0]
+    for child in node.children:
+        write_minified_tree(child, parts)
+    parts.append(')')
+
+
+def minify_sgf(sgf_content):
+    """
+    Rewrites SGF content in a canonical compact form for Anki:
+    - Drops properties the anki-tsumego template does not use (AP, CA, FF, ...).
+    - Merges repeated properties of a node, e.g. AB[aa]AB[bb] -> AB[aa][bb],
+      and sorts and deduplicates AB/AW/AE points.
+    - Drops empty comments and all whitespace between nodes and properties.
+    """
+    parts = []
+    for game in parse_sgf_to_tree(sgf_content).children:
+        write_minified_tree(game, parts)
+    return ''.join(parts)
+
+
 def natural_sort_key(s):
     """
     Key for natural sorting (e.g., '1' < '2' < '10').
@@ -59,29 +164,446 @@ def natural_sort_key(s):
             for text in re.split('([0-9]+)', s)]
 
 
+def find_sgf_files(input_dir, recursive=False, collection=()):
+    """
+    Yields (collection, path) for every .sgf file in input_dir, where
+    collection is the tuple of subdirectory names leading to the file.
+    Each directory's files are yielded in natural order before its
+    subdirectories are visited, so files of one collection are contiguous.
+    Symlinked directories are not followed, like os.walk, so link loops
+    can't recurse forever.
+    """
+    with os.scandir(input_dir) as it:
+        entries = sorted(it, key=lambda entry: natural_sort_key(entry.name))
+    subdirs = []
+    for entry in entries:
+        if entry.is_file() and entry.name.endswith('.sgf'):
+            yield collection, entry.path
+        elif recursive and entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry)
+    for entry in subdirs:
+        yield from find_sgf_files(entry.path, recursive, collection + (entry.name,))
+
+
+def read_sgf_games(sgf_file_path):
+    """
+    Yields (game, processed content) for each game in an SGF file, numbered
+    like sgf_index.py numbers them. Files are read in chunks, so collections
+    with thousands of games use constant memory.
+    """
+    with open(sgf_file_path, 'r', encoding='utf-8') as sgf_file:
+        for game, _, game_text, _ in iter_sgf_games(sgf_file):
+            yield game, process_sgf_content(game_text)
+
+
+def iter_indexed_problems(index_file, where=None, order_by=None, by_collection=False):
+    """
+    Yields (collection, relative_path, game, byte_offset, byte_length) for the
+    problems in an index built by sgf_index.py. `where` and `order_by` are SQL
+    expressions over the index columns (e.g. "depth <= 3", "nodes, depth").
+    Without order_by, problems come in the same natural order as
+    find_sgf_files. by_collection keeps each collection's problems together.
+    """
+    query = 'SELECT collection, path, game, byte_offset, byte_length FROM problems'
+    if where:
+        query += f' WHERE {where}'
+    conn = sqlite3.connect(f'file:{index_file}?mode=ro', uri=True)
+    try:
+        if order_by:
+            ordering = (['collection'] if by_collection else []) + [order_by, 'path', 'game']
+            rows = conn.execute(f"{query} ORDER BY {', '.join(ordering)}")
+        else:
+            def key(row):
+                collection, path, game = row[:3]
+                parts = collection.split('/') if collection else []
+                return [natural_sort_key(part) for part in parts], natural_sort_key(path.rsplit('/', 1)[-1]), game
+            rows = sorted(conn.execute(query), key=key)
+        for collection, path, game, byte_offset, byte_length in rows:
+            yield tuple(collection.split('/')) if collection else (), path, game, byte_offset, byte_length
+    finally:
+        conn.close()
+
+
+def find_stale_index_files(input_dir, index_file):
+    """
+    Yields the relative paths of indexed files that were modified or removed
+    since the index was built, comparing their modification time and size
+    with the index. Byte offsets stored for such files no longer point at
+    the right game trees.
+    """
+    conn = sqlite3.connect(f'file:{index_file}?mode=ro', uri=True)
+    try:
+        for relative_path, mtime_ns, size in conn.execute('SELECT path, mtime_ns, size FROM files ORDER BY path'):
+            try:
+                stat = os.stat(os.path.join(input_dir, *relative_path.split('/')))
+            except FileNotFoundError:
+                yield relative_path
+                continue
+            if (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+                yield relative_path
+    finally:
+        conn.close()
+
+
+def read_indexed_game(input_dir, relative_path, byte_offset, byte_length):
+    """
+    Returns the processed content of one game tree located through the index.
+    """
+    with open(os.path.join(input_dir, *relative_path.split('/')), 'rb') as sgf_file:
+        sgf_file.seek(byte_offset)
+        # Match the newline translation done when reading files in text mode
+        sgf_content = sgf_file.read(byte_length).decode('utf-8').replace('\r\n', '\n')
+    return process_sgf_content(sgf_content)
+
+
+def collection_tag(collection):
+    """
+    Returns a hierarchical Anki tag for a collection, e.g.
+    ('Life & Death', 'Elementary') -> 'Life_&_Death::Elementary'.
+    """
+    return '::'.join(part.replace(' ', '_') for part in collection)
+
+
+def collection_deck(deck_name, collection):
+    return '::'.join((deck_name,) + collection)
+
+
+def output_path(output_file, collection=(), shard_index=None):
+    """
+    Returns the path of one output file, adding the collection name and shard
+    number to the stem of output_file when given.
+    """
+    stem, ext = os.path.splitext(output_file)
+    parts = [stem]
+    if collection:
+        parts.append(re.sub(r'[<>:"/\\|?*]', '', ' - '.join(collection)))
+    if shard_index is not None:
+        parts.append(f'{shard_index:03d}')
+    return '_'.join(parts) + ext
+
+
+def chunked(iterable, size):
+    """
+    Splits an iterable into consecutive iterators of at most `size` items
+    without materialising them. Each chunk must be consumed before the next.
+    """
+    iterator = iter(iterable)
+    for first in iterator:
+        yield itertools.chain([first], itertools.islice(iterator, size - 1))
+
+
+def write_tsv(output_file, notes, include_tags=False):
+    """
+    Writes (note_key, sgf_content, tags) notes to a TSV file, with the tags in a second
+    column if include_tags is set. Returns the number of notes written.
+    """
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as tsv_file:
+        for _, sgf_content, tags in notes:
+            if include_tags:
+                tsv_file.write(sgf_content + '\t' + ' '.join(tags) + '\n')
+            else:
+                tsv_file.write(sgf_content + '\n')
+            count += 1
+    return count
+
+
+def problem_key(deck_name, relative_path, game):
+    """
+    Returns the identity of a problem: the top-level deck it is exported to,
+    its path relative to the input directory ('/'-separated) and its 1-based
+    game tree number. The deck name keeps archives that share file names,
+    like '1.sgf', from overwriting each other's notes.
+    """
+    return f'{deck_name}/{relative_path}#{game}'
+
+
+def note_guid(note_key):
+    """
+    Returns a stable Anki note GUID derived from a problem_key. The key does
+    not depend on the SGF content, so re-importing a package after a problem
+    was corrected, re-converted or minified updates the existing note.
+    """
+    value = int.from_bytes(hashlib.sha256(note_key.encode('utf-8')).digest()[:8], 'big')
+    guid = ''
+    while value:
+        value, rem = divmod(value, len(GUID_CHARS))
+        guid = GUID_CHARS[rem] + guid
+    return guid or GUID_CHARS[0]
+
+
+def deck_id(deck_name):
+    """
+    Returns a stable Anki deck id derived from the deck name.
+    """
+    return int(hashlib.sha1(deck_name.encode('utf-8')).hexdigest()[:10], 16) + 2
+
+
+def field_checksum(text):
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def default_note_type(did, now):
+    """
+    Returns a minimal anki-tsumego note type with a single SGF field, used
+    when no note type is taken from the user's collection.
+    """
+    return {
+        'id': ANKI_MODEL_ID, 'name': ANKI_MODEL_NAME, 'type': 0, 'mod': now,
+        'usn': -1, 'sortf': 0, 'did': did, 'tags': [], 'vers': [],
+        'flds': [
+            {'name': name, 'ord': i, 'sticky': False, 'rtl': False,
+             'font': 'Arial', 'size': 20, 'media': []}
+            for i, name in enumerate(ANKI_FIELDS)
+        ],
+        'tmpls': [{
+            'name': 'Card 1', 'ord': 0, 'qfmt': '{{SGF}}',
+            'afmt': '{{FrontSide}}', 'did': None, 'bqfmt': '', 'bafmt': '',
+        }],
+        'req': [[0, 'all', [0]]],
+        'css': '.card { font-family: arial; font-size: 20px; }',
+        'latexPre': '\\documentclass[12pt]{article}\n\\begin{document}\n',
+        'latexPost': '\\end{document}',
+    }
+
+
+def load_note_type(apkg_path, name=ANKI_MODEL_NAME):
+    """
+    Returns the note type called `name` from an Anki package exported from
+    the user's collection, so that notes can be written onto it directly
+    with its id, fields and templates. Only packages exported with
+    "Support older Anki versions" store note types in a readable form.
+    Raises ValueError if the note type can't be found or is a cloze type.
+    """
+    with zipfile.ZipFile(apkg_path) as apkg:
+        members = [m for m in ('collection.anki21', 'collection.anki2') if m in apkg.namelist()]
+        if not members:
+            raise ValueError(f"'{apkg_path}' does not contain an Anki collection")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            apkg.extract(members[0], tmp_dir)
+            conn = sqlite3.connect(os.path.join(tmp_dir, members[0]))
+            try:
+                models = json.loads(conn.execute('SELECT models FROM col').fetchone()[0])
+            finally:
+                conn.close()
+    for model in models.values():
+        if model['name'] == name:
+            if model.get('type', 0) != 0:
+                raise ValueError(f"Note type '{name}' is a cloze note type, which is not supported")
+            return model
+    raise ValueError(f"No note type named '{name}' in '{apkg_path}'. Export a deck using it "
+                     f"with \"Support older Anki versions\" checked.")
+
+
+def sgf_field_index(model):
+    """
+    Returns the position of the field receiving the SGF: the field named
+    SGF (in any case), or the first field if there is none.
+    """
+    names = [field['name'].lower() for field in sorted(model['flds'], key=lambda field: field['ord'])]
+    return names.index('sgf') if 'sgf' in names else 0
+
+
+def anki_collection_config(deck_name, did, now, model):
+    """
+    Returns the JSON columns of the `col` table for a collection holding a
+    single deck of notes of the given note type.
+    """
+    conf = {
+        'activeDecks': [1], 'curDeck': 1, 'newSpread': 0, 'collapseTime': 1200,
+        'timeLim': 0, 'estTimes': True, 'dueCounts': True, 'curModel': str(model['id']),
+        'nextPos': 1, 'sortType': 'noteFld', 'sortBackwards': False, 'addToCur': True,
+    }
+    def deck_entry(entry_id, name):
+        return {
+            'id': entry_id, 'name': name, 'desc': '', 'mod': now, 'usn': -1, 'conf': 1,
+            'dyn': 0, 'collapsed': False, 'extendNew': 10, 'extendRev': 50,
+            'newToday': [0, 0], 'revToday': [0, 0], 'lrnToday': [0, 0], 'timeToday': [0, 0],
+        }
+    decks = {'1': deck_entry(1, 'Default'), str(did): deck_entry(did, deck_name)}
+    models = {str(model['id']): model}
+    dconf = {
+        '1': {
+            'id': 1, 'name': 'Default', 'mod': 0, 'usn': 0, 'maxTaken': 60,
+            'autoplay': True, 'timer': 0, 'replayq': True, 'dyn': False,
+            'new': {'delays': [1, 10], 'ints': [1, 4, 7], 'initialFactor': 2500,
+                    'order': 1, 'perDay': 20, 'separate': True, 'bury': True},
+            'lapse': {'delays': [10], 'mult': 0, 'minInt': 1, 'leechFails': 8,
+                      'leechAction': 0},
+            'rev': {'perDay': 100, 'ease4': 1.3, 'fuzz': 0.05, 'minSpace': 1,
+                    'ivlFct': 1, 'maxIvl': 36500, 'bury': True},
+        }
+    }
+    return json.dumps(conf), json.dumps(models), json.dumps(decks), json.dumps(dconf)
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_apkg(output_file, deck_name, notes, start=0, model=None):
+    """
+    Writes an Anki package containing one deck of anki-tsumego notes.
+    `notes` is an iterable of (note_key, sgf_content, tags) and is consumed in
+    batches, each inserted with executemany() inside a single transaction.
+    `start` offsets note ids and new-card positions, so that several shards
+    of one deck keep their order. `model` is the note type to use, e.g. from
+    load_note_type; each note gets one card per template of it. Returns the
+    number of notes written.
+    """
+    now = int(time.time())
+    id_base = int(time.time() * 1000)
+    did = deck_id(deck_name)
+    if model is None:
+        model = default_note_type(did, now)
+    field_count = len(model['flds'])
+    sgf_field = sgf_field_index(model)
+    sort_field = model.get('sortf', 0)
+    template_ords = [template['ord'] for template in model['tmpls']]
+    count = 0
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'collection.anki2')
+        conn = sqlite3.connect(db_path)
+        try:
+            # The database is a scratch file until it is zipped, so durability
+            # guarantees are not needed.
+            conn.execute('PRAGMA journal_mode = OFF')
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.executescript(APKG_SCHEMA)
+            with conn:
+                conn.execute(
+                    'INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, ?)',
+                    (now, id_base, id_base) + anki_collection_config(deck_name, did, now, model) + ('{}',)
+                )
+                for batch in batched(notes, APKG_BATCH_SIZE):
+                    note_rows = []
+                    card_rows = []
+                    for note_key, sgf_content, tags in batch:
+                        position = start + count
+                        note_id = id_base + position
+                        count += 1
+                        tag_text = f" {' '.join(tags)} " if tags else ''
+                        fields = [''] * field_count
+                        fields[sgf_field] = sgf_content
+                        note_rows.append((
+                            note_id, note_guid(note_key), model['id'], now, -1, tag_text,
+                            '\x1f'.join(fields), fields[sort_field], field_checksum(fields[0]), 0, ''
+                        ))
+                        card_rows.extend(
+                            (id_base + position * len(template_ords) + i, note_id, did, template_ord, now, -1,
+                             0, 0, position + 1, 0, 0, 0, 0, 0, 0, 0, 0, '')
+                            for i, template_ord in enumerate(template_ords)
+                        )
+                    conn.executemany('INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)', note_rows)
+                    conn.executemany('INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', card_rows)
+        finally:
+            conn.close()
+
+        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as apkg:
+            apkg.write(db_path, 'collection.anki2')
+            apkg.writestr('media', '{}')
+
+    return count
+
+
 def main():
     parser = argparse.ArgumentParser(
-        description='Convert a directory of SGF files to a TSV file for Anki import.'
+        description='Convert a directory of SGF files to a TSV file or Anki package for Anki import.'
     )
     parser.add_argument('input_dir', help='Directory containing the SGF files.')
-    parser.add_argument('output_file', help='Path to the output TSV file.')
+    parser.add_argument('output_file', help='Path to the output file. A name ending in .apkg writes an Anki package, anything else a TSV file.')
+    parser.add_argument('--deck', help='Deck name used for .apkg output. Defaults to the input directory name.')
+    parser.add_argument('--note-type-from', help='With .apkg output, an Anki package exported from your collection (with "Support older Anki versions" checked) whose anki-tsumego note type the notes are written onto.')
+    parser.add_argument('--note-type', default=ANKI_MODEL_NAME, help=f'Name of the note type to use from --note-type-from. Defaults to "{ANKI_MODEL_NAME}".')
+    parser.add_argument('--recursive', action='store_true', help='Also include SGF files in subdirectories. Each subdirectory is treated as a collection.')
+    parser.add_argument('--collections', choices=['tags', 'decks'], help='How to keep collections apart: "tags" tags every note with its collection, "decks" writes a separate output (and .apkg subdeck) per collection.')
+    parser.add_argument('--shard-size', type=int, help='Maximum number of cards per output file. Output files are numbered when set.')
+    parser.add_argument('--minify', action='store_true', help='Write each SGF in a compact canonical form, dropping properties the anki-tsumego template does not use.')
+    parser.add_argument('--index', help='Select and order problems using an index built by sgf_index.py for input_dir, instead of scanning the directory.')
+    parser.add_argument('--where', help='With --index, an SQL condition on the index columns selecting problems, e.g. "depth <= 3 AND stones < 20".')
+    parser.add_argument('--order-by', help='With --index, an SQL ordering over the index columns, e.g. "nodes, depth". Defaults to natural file order.')
     args = parser.parse_args()
 
     if not os.path.isdir(args.input_dir):
         print(f"Error: Input directory not found at '{args.input_dir}'")
         return
+    if args.shard_size is not None and args.shard_size < 1:
+        print("Error: --shard-size must be at least 1")
+        return
+    if (args.where or args.order_by) and not args.index:
+        print("Error: --where and --order-by require --index")
+        return
+    if args.index and not os.path.isfile(args.index):
+        print(f"Error: Index file not found at '{args.index}'")
+        return
+    if args.index:
+        stale = list(find_stale_index_files(args.input_dir, args.index))
+        if stale:
+            print(f"Error: {len(stale)} SGF files changed since '{args.index}' was built, e.g. '{stale[0]}'. "
+                  f"Re-run sgf_index.py to update it.")
+            return
+
+    is_apkg = args.output_file.lower().endswith('.apkg')
+    model = None
+    if args.note_type_from:
+        if not is_apkg:
+            print("Error: --note-type-from requires an .apkg output file")
+            return
+        try:
+            model = load_note_type(args.note_type_from, args.note_type)
+        except (OSError, ValueError, zipfile.BadZipFile, sqlite3.DatabaseError) as e:
+            print(f"Error: Could not read note type from '{args.note_type_from}': {e}")
+            return
+    deck_name = args.deck or os.path.basename(os.path.normpath(args.input_dir))
+    include_tags = args.collections == 'tags'
 
-    sgf_files = glob.glob(os.path.join(args.input_dir, '*.sgf'))
-    sgf_files.sort(key=natural_sort_key)
+    # Everything below is lazy: files are discovered, read and written one at
+    # a time, so memory use does not grow with the size of the archive.
+    # Every game tree becomes one card, so multi-game files yield several.
+    postprocess = minify_sgf if args.minify else (lambda sgf_content: sgf_content)
+    if args.index:
+        problems = (
+            (collection, problem_key(deck_name, path, game), postprocess(read_indexed_game(args.input_dir, path, byte_offset, byte_length)))
+            for collection, path, game, byte_offset, byte_length
+            in iter_indexed_problems(args.index, args.where, args.order_by, args.collections == 'decks')
+        )
+    else:
+        problems = (
+            (collection, problem_key(deck_name, '/'.join(collection + (os.path.basename(path),)), game), postprocess(sgf_content))
+            for collection, path in find_sgf_files(args.input_dir, args.recursive)
+            for game, sgf_content in read_sgf_games(path)
+        )
+    if args.collections == 'decks':
+        groups = itertools.groupby(problems, key=lambda problem: problem[0])
+    else:
+        groups = [((), problems)]
 
-    with open(args.output_file, 'w', encoding='utf-8') as tsv_file:
-        for sgf_file_path in sgf_files:
-            with open(sgf_file_path, 'r', encoding='utf-8') as sgf_file:
-                content = sgf_file.read()
-                processed_content = process_sgf_content(content)
-                tsv_file.write(processed_content + '\n')
+    total = 0
+    for collection, group in groups:
+        notes = (
+            (note_key, sgf_content, [collection_tag(problem_collection)] if include_tags and problem_collection else [])
+            for problem_collection, note_key, sgf_content in group
+        )
+        shards = chunked(notes, args.shard_size) if args.shard_size else [notes]
+        for shard_index, shard in enumerate(shards, 1):
+            shard_file = output_path(args.output_file, collection, shard_index if args.shard_size else None)
+            if is_apkg:
+                count = write_apkg(shard_file, collection_deck(deck_name, collection), shard, start=total, model=model)
+            else:
+                count = write_tsv(shard_file, shard, include_tags)
+            total += count
+            print(f"Successfully created '{shard_file}' with {count} SGF problems.")
 
-    print(f"Successfully created '{args.output_file}' with {len(sgf_files)} SGF files.")
+    if args.collections == 'decks' or args.shard_size:
+        print(f"Total SGF problems processed: {total}")
 
 
 if __name__ == '__main__':
@@ -2,12 +2,10 @@ import os
 import re
 import time
 import argparse
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
-from tqdm import tqdm
+
+# requests, urllib3, bs4 and tqdm are imported inside the functions that use
+# them so that `--help` and offline callers don't pay for loading them.
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:137.0) Gecko/20100101 Firefox/137.0",
@@ -18,24 +16,101 @@ HEADERS = {
     "Cookie": "lastVisit=2133; mode=1; lightDark=light; lastSet=50; secondsCheck=15460300; misplays=1;"
 }
 
-def create_session():
+def create_session(max_retries=5):
     """
-    Creates a requests Session with a retry strategy.
+    Creates a requests Session with a retry strategy. With max_retries=0
+    every request is sent exactly once, for callers that schedule their
+    own retries.
     """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
     session = requests.Session()
     session.headers.update(HEADERS)
     
     retry_strategy = Retry(
-        total=5,
+        total=max_retries,
         backoff_factor=1,
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["HEAD", "GET", "OPTIONS"]
-    )
+    ) if max_retries else 0
     adapter = HTTPAdapter(max_retries=retry_strategy)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
     return session
 
+JS_SIMPLE_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+JS_STRING_RUNS = {'"': re.compile(r'[^"\\]*'), "'": re.compile(r"[^'\\]*")}
+
+def read_js_hex(text, i, length):
+    digits = text[i:i + length]
+    if len(digits) != length:
+        raise ValueError(f"Truncated JS escape at position {i}")
+    return int(digits, 16)
+
+def decode_js_strings(js_content):
+    r"""
+    Decodes a JS array of string concatenations, e.g.
+    "(;GM[1]"+"\n"+"C[say \"hi\"]", "...", into the text it evaluates to.
+    Handles the usual escapes including \uXXXX, \u{...} and surrogate pairs.
+    Unpaired surrogates, which can't be written as UTF-8, become U+FFFD.
+    Runs in a single pass over the input.
+    """
+    parts = []
+    i = 0
+    n = len(js_content)
+    while i < n:
+        char = js_content[i]
+        if char in JS_STRING_RUNS:
+            run = JS_STRING_RUNS[char]
+            i += 1
+            while True:
+                match = run.match(js_content, i)
+                parts.append(match.group())
+                i = match.end()
+                if i >= n:
+                    raise ValueError("Unterminated JS string literal")
+                if js_content[i] == char:
+                    i += 1
+                    break
+                # Backslash escape
+                escape = js_content[i + 1:i + 2]
+                i += 2
+                if escape == 'u':
+                    if js_content.startswith('{', i):
+                        end = js_content.find('}', i)
+                        if end == -1:
+                            raise ValueError(f"Truncated JS escape at position {i}")
+                        code = int(js_content[i + 1:end], 16)
+                        i = end + 1
+                    else:
+                        code = read_js_hex(js_content, i, 4)
+                        i += 4
+                        # Combine UTF-16 surrogate pairs into one code point
+                        if 0xD800 <= code < 0xDC00 and js_content.startswith('\\u', i):
+                            low = read_js_hex(js_content, i + 2, 4)
+                            if 0xDC00 <= low < 0xE000:
+                                code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                                i += 6
+                    if 0xD800 <= code < 0xE000:
+                        code = 0xFFFD
+                    parts.append(chr(code))
+                elif escape == 'x':
+                    parts.append(chr(read_js_hex(js_content, i, 2)))
+                    i += 2
+                elif escape == '\r':
+                    # Line continuation, possibly written as \r\n
+                    if js_content.startswith('\n', i):
+                        i += 1
+                elif escape not in ('\n', '\u2028', '\u2029'):
+                    parts.append(JS_SIMPLE_ESCAPES.get(escape, escape))
+        elif char.isspace() or char in '+,':
+            i += 1
+        else:
+            raise ValueError(f"Unexpected character {char!r} in JS string expression at position {i}")
+    return ''.join(parts)
+
 def clean_sgf_js(raw_js_array_content):
     """
     Takes the raw content found inside the JS Blob brackets: 
@@ -43,27 +118,7 @@ def clean_sgf_js(raw_js_array_content):
     
     Returns clean SGF text.
     """
-    # 1. Replace the concatenation pattern '"+"\n"+"' where \n is literal backslash-n
-    content = raw_js_array_content.replace('"+"\\n"+"', '\n')
-    
-    # 2. Handle variations with spaces
-    content = re.sub(r'"\s*\+\s*"\\n"\s*\+\s*"', '\n', content)
-
-    # 3. Handle the trailing artifact '"+"\n"+""'
-    content = content.replace('"+"\\n"+""', '')
-    content = re.sub(r'"\s*\+\s*"\\n"\s*\+\s*""', '', content)
-
-    # 4. Remove any remaining " + " patterns if they exist (though usually it's just the newlines)
-    content = re.sub(r'"\s*\+\s*"', '', content)
-
-    # 5. Remove the surrounding quotes from the JS string literals.
-    content = content.strip()
-    if content.startswith('"'):
-        content = content[1:]
-    if content.endswith('"'):
-        content = content[:-1]
-        
-    return content
+    return decode_js_strings(raw_js_array_content).strip()
 
 def sanitize_filename(name):
     name = name.replace("/", "_")
@@ -71,6 +126,8 @@ def sanitize_filename(name):
     return name.strip()
 
 def get_problem_details(session, problem_url):
+    from bs4 import BeautifulSoup
+
     try:
         response = session.get(problem_url)
         if response.status_code != 200:
@@ -101,68 +158,85 @@ def get_problem_details(session, problem_url):
         print(f"Error fetching {problem_url}: {e}")
         return None, None
 
-def main():
-    parser = argparse.ArgumentParser(description='Download Tsumego Hero collections and convert them to SGF files.')
-    parser.add_argument('url', help='The URL of the collection to download (e.g., https://tsumego.com/sets/view/50/1).')
-    parser.add_argument('--output', default='.', help='The parent output directory. A subdirectory named after the collection will be created here to store the SGF files.')
-    args = parser.parse_args()
+def get_collection_details(session, collection_url):
+    """
+    Fetches a collection page and returns (collection_name, problem_urls),
+    or (None, None) if the page can't be loaded.
+    """
+    from bs4 import BeautifulSoup
 
-    parsed_url = urlparse(args.url)
+    parsed_url = urlparse(collection_url)
     base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    collection_url = args.url
-    
-    session = create_session()
-    
-    print(f"Fetching collection: {collection_url}...")
+
     try:
         response = session.get(collection_url)
     except Exception as e:
         print(f"Failed to access collection page: {e}")
-        return
+        return None, None
     
     if response.status_code != 200:
         print(f"Failed to access collection page: {response.status_code}")
-        return
+        return None, None
 
     soup = BeautifulSoup(response.text, 'html.parser')
 
     # --- 1. Extract Correct Collection Name ---
     collection_name_tag = soup.select_one('.homeLeft .title4')
     collection_name = collection_name_tag.text.strip() if collection_name_tag else "Tsumego_Collection"
-    
-    folder_name = os.path.join(args.output, sanitize_filename(collection_name))
-    if not os.path.exists(folder_name):
-        os.makedirs(folder_name)
-        print(f"Created directory: {folder_name}")
 
     # --- 2. Extract Problem Links ---
-    problem_links = []
+    problem_urls = []
     link_elements = soup.select('li.statusN a.tooltip, li.statusV a.tooltip')
     for link in link_elements:
         href = link.get('href')
         if href:
-            problem_links.append(href)
+            problem_urls.append(f"{base_url}{href}")
+
+    return collection_name, problem_urls
+
+def save_problem(folder_name, title, sgf_content):
+    filename = f"{sanitize_filename(title)}.sgf"
+    file_path = os.path.join(folder_name, filename)
+    
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(sgf_content)
+
+def main():
+    parser = argparse.ArgumentParser(description='Download Tsumego Hero collections and convert them to SGF files.')
+    parser.add_argument('url', help='The URL of the collection to download (e.g., https://tsumego.com/sets/view/50/1).')
+    parser.add_argument('--output', default='.', help='The parent output directory. A subdirectory named after the collection will be created here to store the SGF files.')
+    args = parser.parse_args()
+
+    from tqdm import tqdm
 
-    print(f"Found {len(problem_links)} problems in '{collection_name}'. Starting download...")
+    collection_url = args.url
+    
+    session = create_session()
+    
+    print(f"Fetching collection: {collection_url}...")
+    collection_name, problem_urls = get_collection_details(session, collection_url)
+    if collection_name is None:
+        return
+    
+    folder_name = os.path.join(args.output, sanitize_filename(collection_name))
+    if not os.path.exists(folder_name):
+        os.makedirs(folder_name)
+        print(f"Created directory: {folder_name}")
+
+    print(f"Found {len(problem_urls)} problems in '{collection_name}'. Starting download...")
 
     # --- 3. Iterate and Download ---
-    for rel_link in tqdm(problem_links, desc="Downloading problems"):
-        full_url = f"{base_url}{rel_link}"
-        
+    for full_url in tqdm(problem_urls, desc="Downloading problems"):
         title, sgf_content = get_problem_details(session, full_url)
         
         if title and sgf_content:
-            filename = f"{sanitize_filename(title)}.sgf"
-            file_path = os.path.join(folder_name, filename)
-            
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(sgf_content)
+            save_problem(folder_name, title, sgf_content)
         else:
-            tqdm.write(f"Skipped: {rel_link}")
+            tqdm.write(f"Skipped: {full_url}")
         
         time.sleep(1)
 
     print("\nDownload complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
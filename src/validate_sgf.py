@@ -0,0 +1,218 @@
+#!/usr/bin/python
+import argparse
+import os
+import sys
+
+import numpy as np
+
+try:
+    from .convert_tsumego_hero_sgf_to_ogs_format import iter_sgf_game_trees, board_size, parse_point, parse_point_list
+except ImportError:
+    # Run as a script from the src directory
+    from convert_tsumego_hero_sgf_to_ogs_format import iter_sgf_game_trees, board_size, parse_point, parse_point_list
+
+EMPTY, BLACK, WHITE = 0, 1, 2
+COLORS = {'B': BLACK, 'W': WHITE}
+
+# Issues that make a line unplayable, as opposed to merely suspicious ones
+ILLEGAL = 'illegal'
+SUSPICIOUS = 'suspicious'
+
+
+def neighbours(mask):
+    """
+    Returns the mask of points orthogonally adjacent to any point in mask.
+    """
+    result = np.zeros_like(mask)
+    result[1:, :] |= mask[:-1, :]
+    result[:-1, :] |= mask[1:, :]
+    result[:, 1:] |= mask[:, :-1]
+    result[:, :-1] |= mask[:, 1:]
+    return result
+
+
+def connected_stones(seeds, stones):
+    """
+    Returns the mask of stones in the groups containing any of the seeds.
+    Growth runs through all groups at once, so the cost is one array
+    operation per step of the longest chain rather than per stone.
+    """
+    connected = seeds & stones
+    while True:
+        grown = connected | (stones & neighbours(connected))
+        if np.array_equal(grown, connected):
+            return connected
+        connected = grown
+
+
+def stones_with_liberties(stones, empty):
+    """
+    Returns the mask of stones whose group has at least one liberty.
+    """
+    return connected_stones(neighbours(empty), stones)
+
+
+def play(board, color, point):
+    """
+    Plays a stone on a copy of board and returns (new_board, captured, error).
+    error is None for a legal move, otherwise a description of the problem.
+    """
+    if board[point] != EMPTY:
+        return board, 0, 'point is occupied'
+    board = board.copy()
+    board[point] = color
+    move = np.zeros(board.shape, dtype=bool)
+    move[point] = True
+    adjacent = neighbours(move)
+    empty = board == EMPTY
+    touches_empty = neighbours(empty)
+
+    # Only opponent groups touching the move can be captured, and only if one
+    # of their stones next to the move has no liberty of its own. Groups
+    # elsewhere that already lacked liberties (a broken setup) stay put.
+    captured = 0
+    opponent_stones = board == (WHITE if color == BLACK else BLACK)
+    if (opponent_stones & adjacent & ~touches_empty).any():
+        without_liberties = opponent_stones & ~stones_with_liberties(opponent_stones, empty)
+        dead = connected_stones(without_liberties & adjacent, without_liberties)
+        captured = int(dead.sum())
+        if captured:
+            board[dead] = EMPTY
+            empty = board == EMPTY
+            touches_empty = neighbours(empty)
+
+    if not touches_empty[point]:
+        own_stones = board == color
+        if not stones_with_liberties(own_stones, empty)[point]:
+            return board, captured, 'suicide'
+    return board, captured, None
+
+
+def apply_setup(board, node, width, height, issues, path):
+    """
+    Applies the AB/AW/AE properties of a node to a copy of board.
+    """
+    if not any(key in node.properties for key in ('AB', 'AW', 'AE')):
+        return board
+    board = board.copy()
+    for key, color in (('AE', EMPTY), ('AB', BLACK), ('AW', WHITE)):
+        if key not in node.properties:
+            continue
+        try:
+            for point in parse_point_list(node.properties[key], width, height):
+                if color != EMPTY and board[point] != EMPTY:
+                    issues.append((SUSPICIOUS, path, f"{key} places a stone on an occupied point"))
+                board[point] = color
+        except ValueError as e:
+            issues.append((ILLEGAL, path, f"{key}: {e}"))
+    return board
+
+
+def validate_game(root):
+    """
+    Replays every variation of a game tree from its setup position and
+    returns a list of (severity, move_path, message) issues, where move_path
+    is the sequence of moves leading to the problem, e.g. 'B[aa] W[bb]'.
+    """
+    issues = []
+    try:
+        width, height = board_size(root)
+    except ValueError:
+        return [(ILLEGAL, '', f"invalid board size {root.properties['SZ'][0]!r}")]
+
+    board = apply_setup(np.zeros((height, width), dtype=np.int8), root, width, height, issues, '')
+    for color in (BLACK, WHITE):
+        stones = board == color
+        if (stones & ~stones_with_liberties(stones, board == EMPTY)).any():
+            issues.append((SUSPICIOUS, '', "setup position contains a group without liberties"))
+            break
+
+    first_player = COLORS.get(root.properties.get('PL', [''])[0].upper())
+
+    # Each stack entry: (node, board, board before the previous move, last colour, path)
+    stack = [(child, board, None, None, '') for child in reversed(root.children)]
+    if any(key in root.properties for key in COLORS):
+        stack = [(root, board, None, None, '')]
+    while stack:
+        node, board, previous_board, last_color, path = stack.pop()
+        if node is not root:
+            board = apply_setup(board, node, width, height, issues, path)
+        before_move = board
+        moves = [key for key in COLORS if key in node.properties]
+        if len(moves) > 1:
+            issues.append((ILLEGAL, path, "node contains both a black and a white move"))
+            continue
+        if moves:
+            key = moves[0]
+            value = node.properties[key][0] if node.properties[key] else ''
+            color = COLORS[key]
+            path = f"{path} {key}[{value}]".strip()
+            if last_color is None and first_player is not None and color != first_player:
+                issues.append((SUSPICIOUS, path, f"first move does not match PL[{root.properties['PL'][0]}]"))
+            if last_color == color:
+                issues.append((SUSPICIOUS, path, "same player moves twice in a row"))
+            try:
+                point = parse_point(value, width, height)
+            except ValueError as e:
+                issues.append((ILLEGAL, path, str(e)))
+                continue
+            if point is not None:
+                board, captured, error = play(board, color, point)
+                if error is None and captured == 1 and previous_board is not None and np.array_equal(board, previous_board):
+                    error = 'retakes a ko immediately'
+                if error is not None:
+                    issues.append((ILLEGAL, path, error))
+                    # The rest of this line can't be replayed meaningfully
+                    continue
+            last_color = color
+        for child in reversed(node.children):
+            stack.append((child, board, before_move if moves else previous_board, last_color, path))
+    return issues
+
+
+def find_sgf_paths(path):
+    if os.path.isfile(path):
+        yield path
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".sgf"):
+                yield os.path.join(root, file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay every variation of SGF problems and report illegal or suspicious moves.')
+    parser.add_argument('path', help='Path to SGF file or directory (searched recursively)')
+    parser.add_argument('--illegal-only', action='store_true', help='Only report illegal moves, not suspicious ones.')
+    args = parser.parse_args()
+
+    problem_count = 0
+    illegal_count = 0
+    suspicious_count = 0
+    for file_path in find_sgf_paths(args.path):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for game_index, game in enumerate(iter_sgf_game_trees(f), 1):
+                    problem_count += 1
+                    for severity, move_path, message in validate_game(game):
+                        if severity == ILLEGAL:
+                            illegal_count += 1
+                        else:
+                            suspicious_count += 1
+                            if args.illegal_only:
+                                continue
+                        location = f"{file_path}#{game_index}"
+                        if move_path:
+                            location += f" {move_path}"
+                        print(f"{severity}: {location}: {message}")
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+
+    print(f"\nChecked {problem_count} problems: {illegal_count} illegal, {suspicious_count} suspicious.")
+    if illegal_count:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import unittest
 import os
-from src.convert_tsumego_hero_sgf_to_ogs_format import parse_sgf_to_tree, serialize_tree_to_sgf, process_node
+import io
+from src.convert_tsumego_hero_sgf_to_ogs_format import (parse_sgf_to_tree, serialize_tree_to_sgf, process_node,
+                                                        iter_sgf_game_tree_texts, iter_sgf_game_trees)
 
 class TestConvertSGF(unittest.TestCase):
     def test_basic_conversion(self):
@@ -90,5 +92,38 @@ class TestConvertSGF(unittest.TestCase):
         new_sgf = serialize_tree_to_sgf(root)
         self.assertIn("C[WRONG]", new_sgf)
 
+    def test_repeated_properties_are_merged(self):
+        """Test that a property repeated within a node keeps all its values."""
+        root = parse_sgf_to_tree("(;GM[1]AB[aa]AB[bb];B[cc]TR[aa]TR[bb])")
+        game = root.children[0]
+        self.assertEqual(game.properties['AB'], ['aa', 'bb'])
+        self.assertEqual(game.children[0].properties['TR'], ['aa', 'bb'])
+
+    def test_iter_game_tree_texts(self):
+        """Test splitting a multi-game file across every possible chunk boundary."""
+        games = [
+            "(;GM[1]C[a ) in a comment];B[aa]C[+])",
+            "(;GM[1]C[escaped \\] and \\\\](;B[aa])(;B[bb]C[(]))",
+            "(;GM[1]C[trailing backslash \\\\];W[cc])",
+        ]
+        content = "garbage\n" + "\n".join(games) + "\n"
+        for chunk_size in range(1, len(content) + 1):
+            texts = list(iter_sgf_game_tree_texts(io.StringIO(content), chunk_size))
+            self.assertEqual(texts, games, f"chunk_size={chunk_size}")
+
+    def test_iter_game_trees(self):
+        """Test that streamed game trees convert like a whole-file parse."""
+        content = "(;GM[1];B[aa]C[+])\n(;GM[1](;B[aa])(;B[bb]C[+]))" * 50
+        root = parse_sgf_to_tree(content)
+        for child in root.children:
+            process_node(child)
+        expected = serialize_tree_to_sgf(root)
+
+        streamed = ""
+        for game in iter_sgf_game_trees(io.StringIO(content), chunk_size=7):
+            process_node(game)
+            streamed += serialize_tree_to_sgf(game)
+        self.assertEqual(streamed, expected)
+
 if __name__ == "__main__":
     unittest.main()
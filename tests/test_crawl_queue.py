@@ -0,0 +1,190 @@
+import unittest
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from src.crawl_queue import WorkQueue, HANDLERS, run_worker, seed_tsumego_hero
+
+PROBLEM_COUNT = 8
+INTERVAL = 0.1
+
+
+class StubTsumegoHero(BaseHTTPRequestHandler):
+    """
+    Serves one collection page and PROBLEM_COUNT problem pages. Problem 3
+    is unavailable on its first request to exercise retries.
+    """
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.requests.append((time.time(), self.path))
+            first_request = [path for _, path in self.requests].count(self.path) == 1
+        if self.path == '/sets/view/1':
+            links = ''.join(f'<li class="statusN"><a class="tooltip" href="/p/{i}">{i}</a></li>' for i in range(1, PROBLEM_COUNT + 1))
+            self.reply(200, f'<div class="homeLeft"><div class="title4">Stub Set</div></div><ul>{links}</ul>')
+        elif self.path.startswith('/p/'):
+            number = self.path[len('/p/'):]
+            if number == '3' and first_request:
+                self.reply(503, 'Service unavailable')
+            else:
+                self.reply(200, f'<a id="playTitleA">Problem {number}</a>'
+                                f'<script>var blob = new Blob(["(;GM[1]"+"\\n"+";B[aa]C[{number}])"], {{type: "sgf"}});</script>')
+        else:
+            self.reply(404, 'Not found')
+
+    def reply(self, status, body):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestCrawlQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.queue_path = os.path.join(self.tmp_dir.name, 'queue.sqlite')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_claim_lease_and_backoff(self):
+        queue = WorkQueue(self.queue_path)
+        try:
+            self.assertEqual(queue.enqueue('ogs', ['http://a/1', 'http://a/2'], 'out'), 2)
+            self.assertEqual(queue.enqueue('ogs', ['http://a/1'], 'out'), 0)
+
+            first = queue.claim('w1')
+            second = queue.claim('w2', lease_seconds=-1)
+            self.assertEqual((first.url, second.url), ('http://a/1', 'http://a/2'))
+            # The second lease has already expired, so another worker can take
+            # it over, and the expiry counts as a failed attempt
+            third = queue.claim('w3')
+            self.assertEqual((third.url, third.attempts), ('http://a/2', 1))
+            self.assertIsNone(queue.claim('w4'))
+            self.assertFalse(queue.complete(second, 'w2'))
+
+            self.assertTrue(queue.complete(first, 'w1'))
+            queue.fail(third, 'w3', 'boom', max_attempts=3, backoff=60)
+            self.assertIsNone(queue.claim('w4'))
+            self.assertEqual(queue.counts(), {'done': 1, 'pending': 1})
+            self.assertFalse(queue.is_finished())
+
+            # Skip the backoff period
+            queue.conn.execute("UPDATE items SET not_before = 0")
+            retry = queue.claim('w4')
+            self.assertEqual((retry.url, retry.attempts), ('http://a/2', 2))
+            queue.fail(retry, 'w4', 'boom again', max_attempts=3)
+            self.assertEqual(queue.counts(), {'done': 1, 'failed': 1})
+            self.assertTrue(queue.is_finished())
+
+            # An item whose worker keeps dying fails once its leases used up the attempts
+            queue.enqueue('ogs', ['http://a/3'], 'out')
+            self.assertEqual(queue.claim('w5', lease_seconds=-1, max_attempts=1).url, 'http://a/3')
+            self.assertIsNone(queue.claim('w6', max_attempts=1))
+            self.assertEqual(queue.counts(), {'done': 1, 'failed': 2})
+        finally:
+            queue.close()
+
+    def test_shared_rate_budget(self):
+        queue = WorkQueue(self.queue_path)
+        try:
+            queue.add_site('example.com', 2.0)
+            start = time.time()
+            slots = [queue.reserve_request('example.com') for _ in range(3)]
+            self.assertLess(slots[0] - start, 0.5)
+            self.assertAlmostEqual(slots[1] - slots[0], 2.0)
+            self.assertAlmostEqual(slots[2] - slots[1], 2.0)
+        finally:
+            queue.close()
+
+    def test_lease_outlives_rate_limit_wait(self):
+        queue = WorkQueue(self.queue_path)
+        try:
+            queue.add_site('example.com', 1.0)
+            # Another worker booked the next slot, so this item waits about 1 s
+            queue.reserve_request('example.com')
+            queue.enqueue('test', ['http://example.com/1'], self.tmp_dir.name)
+        finally:
+            queue.close()
+
+        downloads = []
+        with patch.dict(HANDLERS, {'test': lambda session, url, output_dir: downloads.append(url)}):
+            worker = threading.Thread(target=run_worker, args=(self.queue_path, 'w1', 3, 0.1, 0.05, 0.2))
+            worker.start()
+            time.sleep(0.5)
+            # The lease (0.2 s) would have expired by now without the extension
+            other = WorkQueue(self.queue_path)
+            try:
+                self.assertIsNone(other.claim('w2', lease_seconds=0.2))
+            finally:
+                other.close()
+            worker.join(timeout=10)
+
+        self.assertEqual(downloads, ['http://example.com/1'])
+        queue = WorkQueue(self.queue_path)
+        try:
+            self.assertEqual(queue.counts(), {'done': 1})
+        finally:
+            queue.close()
+
+    def test_workers_with_stub_server(self):
+        StubTsumegoHero.requests = []
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubTsumegoHero)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            base_url = f'http://127.0.0.1:{server.server_port}'
+            queue = WorkQueue(self.queue_path)
+            try:
+                self.assertEqual(seed_tsumego_hero(queue, f'{base_url}/sets/view/1', self.tmp_dir.name, INTERVAL), PROBLEM_COUNT)
+            finally:
+                queue.close()
+
+            workers = [
+                multiprocessing.Process(target=run_worker, args=(self.queue_path, f'worker-{i}', 3, 0.1, 0.05))
+                for i in range(3)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join(timeout=30)
+                self.assertEqual(worker.exitcode, 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        queue = WorkQueue(self.queue_path)
+        try:
+            self.assertEqual(queue.counts(), {'done': PROBLEM_COUNT})
+        finally:
+            queue.close()
+
+        folder = os.path.join(self.tmp_dir.name, 'Stub Set')
+        self.assertEqual(sorted(os.listdir(folder)), sorted(f'Problem {i}.sgf' for i in range(1, PROBLEM_COUNT + 1)))
+        with open(os.path.join(folder, 'Problem 3.sgf'), encoding='utf-8') as f:
+            self.assertEqual(f.read(), '(;GM[1]\n;B[aa]C[3])')
+
+        # Each problem was fetched once, except the one retried through the
+        # queue's backoff rather than by the session, and the seeding and
+        # worker requests together kept to the site's request interval.
+        problem_requests = [path for _, path in StubTsumegoHero.requests if path.startswith('/p/')]
+        self.assertEqual(len(problem_requests), PROBLEM_COUNT + 1)
+        self.assertEqual(problem_requests.count('/p/3'), 2)
+        times = sorted(t for t, _ in StubTsumegoHero.requests)
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        self.assertGreater(min(gaps), INTERVAL * 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Upper bound, in microseconds, for importing a CLI module.
+IMPORT_TIME_BUDGET_US = 100_000
+
+HEAVY_MODULES = ['requests', 'bs4', 'urllib3', 'tqdm']
+
+
+def run_with_importtime(args):
+    """
+    Runs python with -X importtime and returns a dict mapping each imported
+    module to its cumulative import time in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+
+class TestImportTime(unittest.TestCase):
+
+    def assert_fast_import(self, module_name):
+        timings = run_with_importtime(['-c', f'import {module_name}'])
+        for heavy in HEAVY_MODULES:
+            self.assertNotIn(heavy, timings, f'{module_name} imports {heavy} at load time')
+        self.assertLess(timings[module_name], IMPORT_TIME_BUDGET_US)
+
+    def test_tsumego_hero_import_time(self):
+        self.assert_fast_import('src.tsumego_hero_collection_to_sgf')
+
+    def test_ogs_import_time(self):
+        self.assert_fast_import('src.ogs_collection_to_sgf')
+
+    def test_cli_import_time(self):
+        self.assert_fast_import('src.cli')
+
+    def test_cli_help_skips_heavy_imports(self):
+        for command in ['ogs', 'tsumego-hero']:
+            timings = run_with_importtime([os.path.join('src', 'cli.py'), command, '--help'])
+            for heavy in HEAVY_MODULES:
+                self.assertNotIn(heavy, timings)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import io
+import json
+import time
+import tracemalloc
+from unittest.mock import patch, MagicMock
+
+from src.ogs_collection_to_sgf import (decode_puzzle, decode_collection_summary, decode_collection_name, fetch_puzzle,
+                                       writePuzzle)
+
+
+def make_puzzle(depth=2, width=2):
+    """
+    Builds OGS puzzle JSON with a full move tree of the given depth and width.
+    """
+    def branch(level, i):
+        node = {'x': (level + i) % 19, 'y': level % 19}
+        if level == depth:
+            node['correct_answer' if i == 0 else 'wrong_answer'] = True
+        else:
+            node['branches'] = [branch(level + 1, j) for j in range(width)]
+        return node
+
+    return {
+        'name': 'Test / 1',
+        'width': 19,
+        'height': 19,
+        'initial_state': {'black': 'aabb', 'white': 'cc'},
+        'initial_player': 'black',
+        'puzzle_description': 'Black to live',
+        'move_tree': {
+            'x': -1, 'y': -1,
+            'marks': [{'x': 0, 'y': 1, 'marks': {'letter': 'A'}}, {'x': 2, 'y': 2, 'marks': {'triangle': True}}],
+            'branches': [branch(1, i) for i in range(width)],
+        },
+    }
+
+
+def write_sgf(puzzle):
+    file = io.StringIO()
+    writePuzzle(file, puzzle)
+    return file.getvalue()
+
+
+class TestOgsCollectionToSgf(unittest.TestCase):
+
+    def test_write_puzzle(self):
+        puzzle = decode_puzzle({
+            'name': 'Test',
+            'width': 9,
+            'height': 7,
+            'initial_state': {'black': 'aabb', 'white': ''},
+            'initial_player': 'white',
+            'move_tree': {
+                'x': -1, 'y': -1, 'text': 'White to kill',
+                'branches': [
+                    {'x': 2, 'y': 0, 'correct_answer': True, 'text': 'Good]',
+                     'marks': [{'x': 0, 'y': 0, 'marks': {'cross': True}}]},
+                    {'x': 3, 'y': 0, 'branches': [{'x': 2, 'y': 0, 'wrong_answer': True}]},
+                ],
+            },
+        })
+        self.assertEqual(
+            write_sgf(puzzle),
+            "(;FF[4]CA[UTF-8]AP[puzzle2sgf:0.1]GM[1]GN[Test]SZ[9:7]AB[aa][bb]PL[W]C[White to kill]"
+            "(;W[ca]MA[aa]C[CORRECT\n\nGood\\]])(;W[da];B[ca]C[WRONG]))"
+        )
+
+    def test_write_puzzle_large_board(self):
+        puzzle = decode_puzzle({
+            'name': 'Big',
+            'width': 52,
+            'height': 30,
+            'initial_state': {'black': '', 'white': ''},
+            'initial_player': 'black',
+            'move_tree': {
+                'x': -1, 'y': -1,
+                'marks': [{'x': 51, 'y': 29, 'marks': {'letter': 'A'}}],
+                'branches': [{'x': 27, 'y': 3, 'correct_answer': True}],
+            },
+        })
+        # Coordinates from 26 on are written as upper-case letters
+        self.assertEqual(
+            write_sgf(puzzle),
+            "(;FF[4]CA[UTF-8]AP[puzzle2sgf:0.1]GM[1]GN[Big]SZ[52:30]PL[B]LB[ZD:A];B[Bd]C[CORRECT])"
+        )
+
+    def test_decode_puzzle(self):
+        puzzle = decode_puzzle(make_puzzle())
+        self.assertEqual((puzzle.name, puzzle.initial_player, puzzle.description), ('Test / 1', 'B', 'Black to live'))
+        self.assertEqual([(m.kind, m.letter) for m in puzzle.move_tree.marks], [('LB', 'A'), ('TR', None)])
+        self.assertEqual(len(puzzle.move_tree.branches), 2)
+        self.assertTrue(puzzle.move_tree.branches[0].branches[0].correct)
+        self.assertTrue(puzzle.move_tree.branches[0].branches[1].wrong)
+        self.assertFalse(hasattr(puzzle.move_tree, '__dict__'))
+
+    def test_decode_puzzle_validation(self):
+        puzzle = make_puzzle()
+        puzzle['move_tree']['branches'][1]['branches'][0]['x'] = 19
+        with self.assertRaisesRegex(ValueError, r'move_tree\.branches\[1\]\.branches\[0\]: move \(19, 2\) is off the board'):
+            decode_puzzle(puzzle)
+
+        puzzle = make_puzzle()
+        puzzle['initial_state']['black'] = 'aab'
+        with self.assertRaisesRegex(ValueError, 'initial_state.black'):
+            decode_puzzle(puzzle)
+
+        puzzle = make_puzzle()
+        puzzle['width'] = '19'
+        with self.assertRaisesRegex(ValueError, 'width'):
+            decode_puzzle(puzzle)
+
+    def test_decode_collection_summary(self):
+        self.assertEqual(decode_collection_summary([{'id': 3, 'name': 'a'}, {'id': 5}]), [3, 5])
+        with self.assertRaises(ValueError):
+            decode_collection_summary([{'name': 'a'}])
+
+    def test_decode_collection_name(self):
+        self.assertEqual(decode_collection_name({'id': 1, 'name': 'Tesuji'}), 'Tesuji')
+        self.assertIsNone(decode_collection_name(None))
+        with self.assertRaisesRegex(ValueError, 'collection.name'):
+            decode_collection_name({'id': 1})
+        with self.assertRaisesRegex(ValueError, 'at collection:'):
+            decode_collection_name('Tesuji')
+
+    def test_fetch_puzzle_without_collection(self):
+        response = MagicMock()
+        response.json.return_value = {'puzzle': make_puzzle(), 'collection': None}
+        with patch('requests.get', return_value=response):
+            puzzle, collection_name = fetch_puzzle('https://online-go.com/api/v1/puzzles/1', [])
+        self.assertEqual((puzzle.name, collection_name), ('Test / 1', None))
+
+    def test_decode_benchmark(self):
+        """Decoded records should take less memory than the JSON dicts and convert quickly."""
+        raw = json.dumps(make_puzzle(depth=10, width=2))
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            dicts = json.loads(raw)
+            dict_size = tracemalloc.get_traced_memory()[0] - before
+
+            before = tracemalloc.get_traced_memory()[0]
+            puzzle = decode_puzzle(dicts)
+            record_size = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertLess(record_size, dict_size * 0.75)
+
+        # About 2000 nodes per puzzle, decoded and converted 20 times
+        start = time.perf_counter()
+        for _ in range(20):
+            sgf = write_sgf(decode_puzzle(json.loads(raw)))
+        self.assertLess(time.perf_counter() - start, 5.0)
+        self.assertEqual(sgf.count('C[CORRECT]'), 2 ** 9)
+
+if __name__ == '__main__':
+    unittest.main()
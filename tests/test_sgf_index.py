@@ -0,0 +1,147 @@
+import unittest
+import os
+import sqlite3
+import sys
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+from src.convert_tsumego_hero_sgf_to_ogs_format import parse_sgf_to_tree
+from src.sgf_index import problem_stats, build_index
+from src.sgf_to_anki import (iter_indexed_problems, read_indexed_game, find_stale_index_files, main,
+                             note_guid, problem_key)
+
+
+class TestSgfIndex(unittest.TestCase):
+
+    def write_file(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def test_problem_stats(self):
+        sgf = "(;GN[Test]SZ[9]AB[cc][dc:ed]AW[bb](;B[ba]C[+];W[aa](;B[ab]C[+])(;B[ca]))(;B[gg]))"
+        stats = problem_stats(parse_sgf_to_tree(sgf).children[0])
+        self.assertEqual(stats, {
+            'name': 'Test', 'width': 9, 'height': 9,
+            'nodes': 6, 'depth': 3, 'leaves': 3, 'correct_leaves': 1,
+            'max_branching': 2, 'avg_branching': 5 / 3, 'stones': 6,
+            'min_x': 0, 'min_y': 0, 'max_x': 6, 'max_y': 6,
+        })
+
+    def test_build_index_and_query(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = os.path.join(tmp_dir, 'archive')
+            # Multi-byte characters before the second game check byte offsets
+            self.write_file(os.path.join(archive, '10.sgf'), "(;GM[1]C[死活];B[aa])\r\n(;GM[1];B[aa](;W[bb])(;W[cc]))")
+            self.write_file(os.path.join(archive, '2.sgf'), "(;GM[1];B[aa];W[bb];B[cc])")
+            self.write_file(os.path.join(archive, 'Set A', '1.sgf'), "(;GM[1];B[dd])")
+            index_file = os.path.join(tmp_dir, 'index.sqlite')
+
+            self.assertEqual(build_index(archive, index_file), (3, 0))
+            self.assertEqual(build_index(archive, index_file), (0, 3))
+
+            problems = list(iter_indexed_problems(index_file))
+            self.assertEqual([(c, p, g) for c, p, g, _, _ in problems],
+                             [((), '2.sgf', 1), ((), '10.sgf', 1), ((), '10.sgf', 2), (('Set A',), 'Set A/1.sgf', 1)])
+            contents = [read_indexed_game(archive, p, offset, length) for _, p, _, offset, length in problems]
+            self.assertEqual(contents, [
+                "(;GM[1];B[aa];W[bb];B[cc])",
+                "(;GM[1]C[死活];B[aa])",
+                "(;GM[1];B[aa](;W[bb])(;W[cc]))",
+                "(;GM[1];B[dd])",
+            ])
+
+            ordered = list(iter_indexed_problems(index_file, where='depth >= 2', order_by='depth DESC'))
+            self.assertEqual([p for _, p, _, _, _ in ordered], ['2.sgf', '10.sgf'])
+
+            os.remove(os.path.join(archive, '2.sgf'))
+            self.assertEqual(build_index(archive, index_file), (0, 2))
+            conn = sqlite3.connect(index_file)
+            try:
+                self.assertEqual(conn.execute('SELECT COUNT(*) FROM problems').fetchone()[0], 3)
+            finally:
+                conn.close()
+
+    def test_build_index_skips_invalid_games(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = os.path.join(tmp_dir, 'archive')
+            self.write_file(os.path.join(archive, 'book.sgf'), "(;GM[1];B[aa])(;GM[1];B[zz])(;GM[1];B[cc])")
+            index_file = os.path.join(tmp_dir, 'index.sqlite')
+            with patch('builtins.print') as mock_print:
+                self.assertEqual(build_index(archive, index_file), (1, 0))
+            self.assertIn('Skipping game 2', mock_print.call_args[0][0])
+
+            problems = list(iter_indexed_problems(index_file))
+            self.assertEqual([g for _, _, g, _, _ in problems], [1, 3])
+            _, path, _, byte_offset, byte_length = problems[1]
+            self.assertEqual(read_indexed_game(archive, path, byte_offset, byte_length), "(;GM[1];B[cc])")
+
+    def test_empty_game_trees_numbered_consistently(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = os.path.join(tmp_dir, 'archive')
+            self.write_file(os.path.join(archive, 'x.sgf'), "()\n(;GM[1];B[aa])")
+            index_file = os.path.join(tmp_dir, 'index.sqlite')
+            build_index(archive, index_file)
+            self.assertEqual([(p, g) for _, p, g, _, _ in iter_indexed_problems(index_file)], [('x.sgf', 1)])
+
+            guids = []
+            for options in [[], ['--index', index_file]]:
+                output = os.path.join(tmp_dir, 'out.apkg')
+                with patch.object(sys, 'argv', ['sgf_to_anki.py', archive, output] + options), patch('builtins.print'):
+                    main()
+                with zipfile.ZipFile(output) as apkg:
+                    apkg.extract('collection.anki2', tmp_dir)
+                conn = sqlite3.connect(os.path.join(tmp_dir, 'collection.anki2'))
+                try:
+                    guids.append(conn.execute('SELECT guid, flds FROM notes').fetchall())
+                finally:
+                    conn.close()
+            self.assertEqual(guids[0], [(note_guid(problem_key('archive', 'x.sgf', 1)), "(;GM[1];B[aa])")])
+            self.assertEqual(guids[1], guids[0])
+
+    def test_main_with_index(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = os.path.join(tmp_dir, 'archive')
+            self.write_file(os.path.join(archive, '1.sgf'), "(;GM[1];B[aa];W[bb];B[cc])")
+            self.write_file(os.path.join(archive, '2.sgf'), "(;GM[1];B[aa])")
+            self.write_file(os.path.join(archive, '3.sgf'), "(;GM[1];B[aa];W[bb])")
+            index_file = os.path.join(tmp_dir, 'index.sqlite')
+            build_index(archive, index_file)
+
+            output = os.path.join(tmp_dir, 'out.tsv')
+            argv = ['sgf_to_anki.py', archive, output, '--index', index_file, '--where', 'depth < 3', '--order-by', 'nodes']
+            with patch.object(sys, 'argv', argv), patch('builtins.print'):
+                main()
+            with open(output, encoding='utf-8') as f:
+                self.assertEqual(f.read(), "(;GM[1];B[aa])\n(;GM[1];B[aa];W[bb])\n")
+
+    def test_main_rejects_stale_index(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = os.path.join(tmp_dir, 'archive')
+            self.write_file(os.path.join(archive, '1.sgf'), "(;GM[1];B[aa]C[CORRECT])(;GM[1];B[bb])")
+            self.write_file(os.path.join(archive, '2.sgf'), "(;GM[1];B[cc])")
+            index_file = os.path.join(tmp_dir, 'index.sqlite')
+            build_index(archive, index_file)
+            self.assertEqual(list(find_stale_index_files(archive, index_file)), [])
+
+            # Rewriting a file after indexing shifts its game trees
+            self.write_file(os.path.join(archive, '1.sgf'), "(;GM[1]\n;B[aa]C[CORRECT])\n(;GM[1]\n;B[bb])")
+            os.remove(os.path.join(archive, '2.sgf'))
+            self.assertEqual(list(find_stale_index_files(archive, index_file)), ['1.sgf', '2.sgf'])
+
+            output = os.path.join(tmp_dir, 'out.tsv')
+            with patch.object(sys, 'argv', ['sgf_to_anki.py', archive, output, '--index', index_file]), \
+                    patch('builtins.print') as mock_print:
+                main()
+            self.assertFalse(os.path.exists(output))
+            self.assertIn('changed since', mock_print.call_args[0][0])
+
+            build_index(archive, index_file)
+            with patch.object(sys, 'argv', ['sgf_to_anki.py', archive, output, '--index', index_file]), patch('builtins.print'):
+                main()
+            with open(output, encoding='utf-8') as f:
+                self.assertEqual(f.read(), "(;GM[1];B[aa]C[CORRECT])\n(;GM[1];B[bb])\n")
+
+if __name__ == '__main__':
+    unittest.main()
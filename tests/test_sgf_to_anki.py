@@ -2,9 +2,17 @@ import unittest
 import os
 import sys
 import re
+import json
+import sqlite3
+import tempfile
+import zipfile
+from unittest.mock import patch, MagicMock
 
 # Use standard imports assuming tests are run from the project root
-from src.sgf_to_anki import clean_sgf_comment, process_sgf_content, natural_sort_key
+from src.sgf_to_anki import (clean_sgf_comment, process_sgf_content, natural_sort_key, write_apkg, note_guid, ANKI_MODEL_ID,
+                             problem_key, load_note_type, find_sgf_files, chunked, output_path, collection_tag, main, minify_sgf)
+from src.tsumego_hero_collection_to_sgf import get_problem_details
+from src.convert_tsumego_hero_sgf_to_ogs_format import parse_sgf_to_tree, process_node, serialize_tree_to_sgf
 
 
 class TestSgfToAnki(unittest.TestCase):
@@ -68,5 +76,233 @@ class TestSgfToAnki(unittest.TestCase):
         files.sort(key=natural_sort_key)
         self.assertEqual(files, expected)
 
+    # Tests for .apkg export
+    def read_apkg(self, apkg_path, tmp_dir):
+        with zipfile.ZipFile(apkg_path) as apkg:
+            self.assertEqual(apkg.read('media'), b'{}')
+            apkg.extract('collection.anki2', tmp_dir)
+        return sqlite3.connect(os.path.join(tmp_dir, 'collection.anki2'))
+
+    def test_write_apkg(self):
+        notes = [('a.sgf#1', "(;GM[1];B[aa]C[CORRECT])", []), ('a.sgf#2', "(;GM[1];B[bb]C[WRONG])", ['hard'])]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            apkg_path = os.path.join(tmp_dir, 'deck.apkg')
+            self.assertEqual(write_apkg(apkg_path, 'My Deck', iter(notes)), 2)
+            conn = self.read_apkg(apkg_path, tmp_dir)
+            try:
+                rows = conn.execute('SELECT guid, mid, flds, tags FROM notes ORDER BY id').fetchall()
+                self.assertEqual([r[2] for r in rows], [n[1] for n in notes])
+                self.assertEqual([r[0] for r in rows], [note_guid(n[0]) for n in notes])
+                self.assertTrue(all(r[1] == ANKI_MODEL_ID for r in rows))
+                self.assertEqual(rows[1][3], ' hard ')
+
+                decks = json.loads(conn.execute('SELECT decks FROM col').fetchone()[0])
+                deck_ids = {d['name']: d['id'] for d in decks.values()}
+                self.assertIn('My Deck', deck_ids)
+                cards = conn.execute('SELECT did, due FROM cards ORDER BY due').fetchall()
+                self.assertEqual(cards, [(deck_ids['My Deck'], 1), (deck_ids['My Deck'], 2)])
+            finally:
+                conn.close()
+
+    def test_note_type_from_exported_package(self):
+        model = {
+            'id': 1700000000001, 'name': 'anki-tsumego', 'type': 0, 'mod': 1, 'usn': 5, 'sortf': 1,
+            'did': 1, 'tags': [], 'vers': [], 'css': '.tsumego {}',
+            'flds': [{'name': 'Notes', 'ord': 0}, {'name': 'sgf', 'ord': 1}],
+            'tmpls': [
+                {'name': 'Solve', 'ord': 0, 'qfmt': '<div class="tsumego">{{sgf}}</div>', 'afmt': '{{FrontSide}}'},
+                {'name': 'Review', 'ord': 1, 'qfmt': '{{sgf}}{{Notes}}', 'afmt': '{{FrontSide}}'},
+            ],
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            exported = os.path.join(tmp_dir, 'exported.apkg')
+            write_apkg(exported, 'My Collection', [], model=model)
+            self.assertEqual(load_note_type(exported), model)
+            with self.assertRaisesRegex(ValueError, 'No note type named'):
+                load_note_type(exported, 'Basic')
+
+            archive = os.path.join(tmp_dir, 'archive')
+            os.makedirs(archive)
+            with open(os.path.join(archive, '1.sgf'), 'w', encoding='utf-8') as f:
+                f.write("(;GM[1];B[aa])")
+            output = os.path.join(tmp_dir, 'deck.apkg')
+            with patch.object(sys, 'argv', ['sgf_to_anki.py', archive, output, '--note-type-from', exported]), \
+                    patch('builtins.print'):
+                main()
+            conn = self.read_apkg(output, tmp_dir)
+            try:
+                self.assertEqual(conn.execute('SELECT mid, flds, sfld FROM notes').fetchall(),
+                                 [(model['id'], '\x1f(;GM[1];B[aa])', '(;GM[1];B[aa])')])
+                self.assertEqual([row[0] for row in conn.execute('SELECT ord FROM cards ORDER BY ord')], [0, 1])
+                models = json.loads(conn.execute('SELECT models FROM col').fetchone()[0])
+                self.assertEqual(models, {str(model['id']): model})
+            finally:
+                conn.close()
+
+    def test_note_guid_is_stable(self):
+        self.assertEqual(note_guid(problem_key('Deck', 'Set A/1.sgf', 1)), note_guid(problem_key('Deck', 'Set A/1.sgf', 1)))
+        self.assertNotEqual(note_guid(problem_key('Deck', 'Set A/1.sgf', 1)), note_guid(problem_key('Deck', 'Set A/1.sgf', 2)))
+
+    def test_guids_differ_between_decks(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            guids = {}
+            for deck in ['A', 'B']:
+                os.makedirs(os.path.join(tmp_dir, deck))
+                with open(os.path.join(tmp_dir, deck, '1.sgf'), 'w', encoding='utf-8') as f:
+                    f.write("(;GM[1];B[aa])")
+                output = os.path.join(tmp_dir, f'{deck}.apkg')
+                with patch.object(sys, 'argv', ['sgf_to_anki.py', os.path.join(tmp_dir, deck), output]), patch('builtins.print'):
+                    main()
+                conn = self.read_apkg(output, tmp_dir)
+                try:
+                    guids[deck] = conn.execute('SELECT guid FROM notes').fetchone()[0]
+                finally:
+                    conn.close()
+            self.assertEqual(guids['A'], note_guid(problem_key('A', '1.sgf', 1)))
+            self.assertNotEqual(guids['A'], guids['B'])
+
+    def test_guids_survive_content_changes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = os.path.join(tmp_dir, 'archive')
+            os.makedirs(os.path.join(archive, 'Set A'))
+            sgf_path = os.path.join(archive, 'Set A', '1.sgf')
+            output = os.path.join(tmp_dir, 'deck.apkg')
+
+            def export(content, *options):
+                with open(sgf_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                argv = ['sgf_to_anki.py', archive, output, '--recursive'] + list(options)
+                with patch.object(sys, 'argv', argv), patch('builtins.print'):
+                    main()
+                conn = self.read_apkg(output, tmp_dir)
+                try:
+                    return [row[0] for row in conn.execute('SELECT guid FROM notes ORDER BY id')]
+                finally:
+                    conn.close()
+
+            original = export("(;GM[1];B[aa]C[Corect])(;GM[1];B[bb])")
+            self.assertEqual(original, [note_guid('archive/Set A/1.sgf#1'), note_guid('archive/Set A/1.sgf#2')])
+            # A fixed comment or minified output still updates the same notes
+            self.assertEqual(export("(;GM[1];B[aa]C[Correct])(;GM[1];B[bb])"), original)
+            self.assertEqual(export("(;GM[1];B[aa]C[Correct])(;GM[1];B[bb])", '--minify'), original)
+
+    # Tests for recursive discovery and sharded output
+    def make_archive(self, root):
+        layout = {
+            '': ['2.sgf', '10.sgf', 'notes.txt'],
+            'Set A': ['1.sgf', '2.sgf', '3.sgf'],
+            os.path.join('Set A', 'Part 2'): ['1.sgf'],
+            'Set B': ['1.sgf'],
+        }
+        for subdir, names in layout.items():
+            os.makedirs(os.path.join(root, subdir), exist_ok=True)
+            for name in names:
+                with open(os.path.join(root, subdir, name), 'w', encoding='utf-8') as f:
+                    f.write(f"(;GM[1]GN[{subdir}/{name}])")
+
+    def test_find_sgf_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.make_archive(tmp_dir)
+            found = [(c, os.path.relpath(p, tmp_dir)) for c, p in find_sgf_files(tmp_dir)]
+            self.assertEqual(found, [((), '2.sgf'), ((), '10.sgf')])
+
+            found = [(c, os.path.basename(p)) for c, p in find_sgf_files(tmp_dir, recursive=True)]
+            self.assertEqual(found, [
+                ((), '2.sgf'), ((), '10.sgf'),
+                (('Set A',), '1.sgf'), (('Set A',), '2.sgf'), (('Set A',), '3.sgf'),
+                (('Set A', 'Part 2'), '1.sgf'),
+                (('Set B',), '1.sgf'),
+            ])
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'symlinks not supported')
+    def test_find_sgf_files_ignores_symlink_loops(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.make_archive(tmp_dir)
+            os.symlink(tmp_dir, os.path.join(tmp_dir, 'Set A', 'loop'), target_is_directory=True)
+            found = [(c, os.path.basename(p)) for c, p in find_sgf_files(tmp_dir, recursive=True)]
+            self.assertEqual(len(found), 7)
+
+    def test_chunked(self):
+        self.assertEqual([list(c) for c in chunked(range(5), 2)], [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+    def test_output_path_and_tags(self):
+        self.assertEqual(output_path('out.tsv'), 'out.tsv')
+        self.assertEqual(output_path('out.apkg', ('Set A', 'Part 2'), 3), 'out_Set A - Part 2_003.apkg')
+        self.assertEqual(collection_tag(('Set A', 'Part 2')), 'Set_A::Part_2')
+
+    def test_main_recursive_sharded_decks(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = os.path.join(tmp_dir, 'archive')
+            self.make_archive(archive)
+            output = os.path.join(tmp_dir, 'out.tsv')
+            argv = ['sgf_to_anki.py', archive, output, '--recursive', '--collections', 'decks', '--shard-size', '2']
+            with patch.object(sys, 'argv', argv), patch('builtins.print'):
+                main()
+            self.assertEqual(sorted(os.listdir(tmp_dir)), sorted([
+                'archive', 'out_001.tsv', 'out_Set A_001.tsv', 'out_Set A_002.tsv',
+                'out_Set A - Part 2_001.tsv', 'out_Set B_001.tsv',
+            ]))
+            with open(os.path.join(tmp_dir, 'out_Set A_002.tsv'), encoding='utf-8') as f:
+                self.assertEqual(f.read(), "(;GM[1]GN[Set A/3.sgf])\n")
+
+    def test_main_recursive_tags(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = os.path.join(tmp_dir, 'archive')
+            self.make_archive(archive)
+            output = os.path.join(tmp_dir, 'out.tsv')
+            argv = ['sgf_to_anki.py', archive, output, '--recursive', '--collections', 'tags']
+            with patch.object(sys, 'argv', argv), patch('builtins.print'):
+                main()
+            with open(output, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(len(lines), 7)
+            self.assertEqual(lines[0], "(;GM[1]GN[/2.sgf])\t")
+            self.assertEqual(lines[5], "(;GM[1]GN[Set A/Part 2/1.sgf])\tSet_A::Part_2")
+
+    def test_main_multi_game_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, 'book.sgf'), 'w', encoding='utf-8') as f:
+                f.write("(;GM[1]C[First\nline])\n(;GM[1]C[Second])\n")
+            output = os.path.join(tmp_dir, 'out.tsv')
+            with patch.object(sys, 'argv', ['sgf_to_anki.py', tmp_dir, output]), patch('builtins.print'):
+                main()
+            with open(output, encoding='utf-8') as f:
+                self.assertEqual(f.read(), "(;GM[1]C[First. line])\n(;GM[1]C[Second])\n")
+
+    # Tests for minify_sgf
+    def test_minify_sgf(self):
+        sgf_content = "(;FF[4]CA[UTF-8]AP[CGoban:3]ST[2] RU[Japanese]SZ[19]KM[0.00]PW[white]PB[black]GM[1]\n  AB[cc][aa]AB[bb][aa]AW[dd] PL[B]\n(;B[ba]TR[aa]TR[ca]C[CORRECT])\n(;B[ca]C[];W[ba]C[WRONG]))"
+        self.assertEqual(
+            minify_sgf(sgf_content),
+            "(;SZ[19]AB[aa][bb][cc]AW[dd]PL[B](;B[ba]TR[aa][ca]C[CORRECT])(;B[ca];W[ba]C[WRONG]))"
+        )
+
+    def test_minify_sgf_keeps_escapes(self):
+        sgf_content = "(;GM[1]C[a \\] bracket];B[aa]C[CORRECT])"
+        self.assertEqual(minify_sgf(sgf_content), "(;C[a \\] bracket];B[aa]C[CORRECT])")
+
+    def test_minify_sgf_real_collections(self):
+        """Measure the size reduction on the Tsumego Hero problems in test_data."""
+        test_data_dir = os.path.join(os.path.dirname(__file__), 'test_data')
+        for name in ['1447', '13780']:
+            with open(os.path.join(test_data_dir, name), 'r', encoding='utf-8') as f:
+                mock_response = MagicMock(status_code=200, text=f.read())
+            mock_session = MagicMock()
+            mock_session.get.return_value = mock_response
+            _, sgf_content = get_problem_details(mock_session, f"https://tsumego.com/{name}")
+
+            root = parse_sgf_to_tree(sgf_content)
+            for child in root.children:
+                process_node(child)
+            processed = process_sgf_content(serialize_tree_to_sgf(root))
+            minified = minify_sgf(processed)
+
+            # Same moves and comments, at least 25% smaller
+            self.assertEqual(re.findall(r';[BW]\[..\]|C\[[^\]]*\]', minified),
+                             re.findall(r';[BW]\[..\]|C\[[^\]]*\]', processed))
+            self.assertLess(len(minified), len(processed) * 0.75)
+            self.assertNotIn('AP[', minified)
+
 if __name__ == '__main__':
     unittest.main()
@@ -2,12 +2,14 @@ import unittest
 from unittest.mock import patch, MagicMock
 import os
 import re
+import json
+import time
 from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 # Use standard imports assuming tests are run from the project root
-from src.tsumego_hero_collection_to_sgf import get_problem_details, clean_sgf_js, main, create_session
+from src.tsumego_hero_collection_to_sgf import get_problem_details, clean_sgf_js, decode_js_strings, main, create_session
 
 class TestTsumegoHeroCollectionToSgf(unittest.TestCase):
     def setUp(self):
@@ -108,5 +110,45 @@ class TestTsumegoHeroCollectionToSgf(unittest.TestCase):
         )
         self.assertEqual(cleaned.strip(), expected_sgf.strip())
 
+    def test_decode_js_strings_escapes(self):
+        raw_js = r'''"C[He said \"hi\" \\o/]"+"\n"+ 'it\'s' + "\u00e9\u{1F600}\ud83d\ude00\x41\t"'''
+        self.assertEqual(decode_js_strings(raw_js), 'C[He said "hi" \\o/]\nit\'s\u00e9\U0001F600\U0001F600A\t')
+
+    def test_decode_js_strings_round_trip(self):
+        sgf = '(;GM[1]C[Black\'s "tesuji" \\ \u00e9\u6b7b\U0001F600]\n;B[aa]C[+])'
+        for ensure_ascii in [True, False]:
+            raw_js = '+"\\n"+'.join(json.dumps(line, ensure_ascii=ensure_ascii) for line in sgf.split('\n'))
+            self.assertEqual(clean_sgf_js(raw_js), sgf)
+
+    def test_decode_js_strings_unpaired_surrogates(self):
+        raw_js = r'"C[\ud83d]" + "C[\ude00\ud83d\u0041\u{D800}]"'
+        cleaned = clean_sgf_js(raw_js)
+        self.assertEqual(cleaned, 'C[\ufffd]C[\ufffd\ufffdA\ufffd]')
+        cleaned.encode('utf-8')
+
+    def test_decode_js_strings_array_of_strings(self):
+        self.assertEqual(decode_js_strings('"(;GM[1]", "SZ[19])"'), '(;GM[1]SZ[19])')
+
+    def test_decode_js_strings_malformed(self):
+        with self.assertRaises(ValueError):
+            decode_js_strings('"(;GM[1]')
+        with self.assertRaises(ValueError):
+            decode_js_strings('"a" + b')
+
+    def test_decode_js_strings_benchmark(self):
+        """Decoding large blobs should take time linear in the blob size."""
+        line = '"(;B[aa]C[a \\"quoted\\" comment \\u00e9])"+"\\n"+'
+        def time_decode(repeats):
+            raw_js = line * repeats + '""'
+            start = time.perf_counter()
+            decode_js_strings(raw_js)
+            return time.perf_counter() - start
+
+        small = min(time_decode(20000) for _ in range(3))
+        large = min(time_decode(80000) for _ in range(3))
+        # 80k lines is about 4 MB of JS
+        self.assertLess(large, 5.0)
+        self.assertLess(large, small * 4 * 3)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import io
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+
+from src.convert_tsumego_hero_sgf_to_ogs_format import parse_sgf_to_tree, parse_point_list
+from src.validate_sgf import validate_game, play, stones_with_liberties, main, BLACK, WHITE, ILLEGAL, SUSPICIOUS
+
+
+def validate(sgf_content):
+    return validate_game(parse_sgf_to_tree(sgf_content).children[0])
+
+
+class TestValidateSgf(unittest.TestCase):
+
+    def test_valid_problem(self):
+        sgf = "(;SZ[5]AB[ab]AW[aa]PL[B](;B[ba]C[CORRECT])(;B[bb];W[ba]C[WRONG]))"
+        self.assertEqual(validate(sgf), [])
+
+    def test_capture_frees_point(self):
+        # Black captures the white corner stone, so white may not play back
+        # into the now-surrounded point.
+        self.assertEqual(validate("(;SZ[5]AB[ab]AW[aa];B[ba];W[aa])"), [(ILLEGAL, 'B[ba] W[aa]', 'suicide')])
+        # Black's capturing stone is in atari, so white may take it back once
+        # black has played elsewhere.
+        self.assertEqual(validate("(;SZ[5]AB[ab][dd]AW[aa][bb][ca];B[ba];W[ee];B[ed];W[aa])"), [])
+
+    def test_occupied_point(self):
+        self.assertEqual(validate("(;SZ[5]AB[ab];W[ab])"), [(ILLEGAL, 'W[ab]', 'point is occupied')])
+
+    def test_ko(self):
+        setup = "SZ[5]AB[ba][ab][bc]AW[ca][bb][db][cc]"
+        self.assertEqual(validate(f"(;{setup};B[cb];W[bb])"), [(ILLEGAL, 'B[cb] W[bb]', 'retakes a ko immediately')])
+        self.assertEqual(validate(f"(;{setup};B[cb];W[ee];B[dd];W[bb])"), [])
+
+    def test_off_board(self):
+        self.assertEqual(validate("(;SZ[5];B[fa])"), [(ILLEGAL, 'B[fa]', "point 'fa' is off the board")])
+
+    def test_pass(self):
+        self.assertEqual(validate("(;SZ[19];B[tt];W[aa];B[])"), [])
+
+    def test_suspicious_lines(self):
+        issues = validate("(;SZ[5]PL[W]AB[aa](;B[bb];B[cc])(;W[aa]))")
+        self.assertIn((SUSPICIOUS, 'B[bb]', 'first move does not match PL[W]'), issues)
+        self.assertIn((SUSPICIOUS, 'B[bb] B[cc]', 'same player moves twice in a row'), issues)
+        self.assertIn((ILLEGAL, 'W[aa]', 'point is occupied'), issues)
+
+    def test_setup_without_liberties(self):
+        issues = validate("(;SZ[5]AB[ab][ba]AW[aa];B[cc])")
+        self.assertEqual(issues, [(SUSPICIOUS, '', 'setup position contains a group without liberties')])
+
+    def test_parse_point_list_compressed(self):
+        self.assertEqual(sorted(parse_point_list(['aa:bb', 'cc'], 5, 5)), [(0, 0), (0, 1), (1, 0), (1, 1), (2, 2)])
+        with self.assertRaisesRegex(ValueError, 'pass'):
+            list(parse_point_list(['tt:aa'], 19, 19))
+
+    def test_setup_rectangle_with_pass(self):
+        issues = validate("(;SZ[19]AB[tt:aa]AW[bb];B[cc])")
+        self.assertEqual(issues, [(ILLEGAL, '', "AB: rectangle 'tt:aa' has a pass as a corner")])
+
+    def test_stones_with_liberties(self):
+        board = np.zeros((3, 3), dtype=np.int8)
+        board[0, 0] = board[0, 1] = WHITE
+        board[1, 0] = board[1, 1] = board[0, 2] = BLACK
+        white = board == WHITE
+        self.assertFalse(stones_with_liberties(white, board == 0).any())
+        board[0, 2] = 0
+        new_board, captured, error = play(board, BLACK, (0, 2))
+        self.assertEqual((captured, error), (2, None))
+        self.assertEqual(int((new_board == WHITE).sum()), 0)
+
+    def test_capture_ignores_groups_away_from_move(self):
+        # White at (0, 0) already has no liberties in the setup
+        board = np.zeros((5, 5), dtype=np.int8)
+        board[0, 0] = board[4, 4] = WHITE
+        board[0, 1] = board[1, 0] = board[3, 4] = BLACK
+        new_board, captured, error = play(board, BLACK, (4, 3))
+        self.assertEqual((captured, error), (1, None))
+        self.assertEqual((new_board[0, 0], new_board[4, 4]), (WHITE, 0))
+
+    def test_main_reports_and_exits(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, 'book.sgf'), 'w', encoding='utf-8') as f:
+                f.write("(;SZ[5];B[aa])\n(;SZ[5]AB[ab];W[ab])")
+            output = io.StringIO()
+            with patch.object(sys, 'argv', ['validate_sgf.py', tmp_dir]), patch('sys.stdout', output):
+                with self.assertRaises(SystemExit) as cm:
+                    main()
+            self.assertEqual(cm.exception.code, 1)
+            self.assertIn("book.sgf#2 W[ab]: point is occupied", output.getvalue())
+            self.assertIn("Checked 2 problems: 1 illegal, 0 suspicious.", output.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()